@@ -0,0 +1,103 @@
+import bisect
+import threading
+import time
+from typing import NamedTuple
+
+from core.db import read_from_primary
+from django.conf import settings
+from recipe.models import IngredientModel
+
+from .cache import INGREDIENTS, get_version
+
+
+def normalize(value: str) -> str:
+    """Приводит строку к виду для сравнения без учета регистра и ё."""
+    return value.casefold().replace('ё', 'е')
+
+
+class _Snapshot(NamedTuple):
+    """Неизменяемое состояние индекса одной версии."""
+
+    version: float
+    built_at: float
+    items: list
+    names: list
+    prefixes: list
+    suffixes: list
+
+
+class IngredientIndex:
+    """
+    Индекс автодополнения ингредиентов в памяти процесса.
+
+    Хранит отсортированные нормализованные названия и их развороты,
+    поиск по началу и по окончанию названия выполняется бинарным
+    поиском. Индекс перестраивается при смене версии ингредиентов
+    или по истечении INGREDIENT_INDEX_TTL. Новое состояние собирается
+    целиком и публикуется одним присваиванием, поэтому поиск
+    из другого потока видит либо старый, либо новый индекс.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def search(self, query: str) -> list:
+        """Ингредиенты, чье название начинается или кончается на query."""
+        snapshot = self._get_snapshot()
+        items, names = snapshot.items, snapshot.names
+        needle = normalize(query)
+        prefix = list(self._scan(snapshot.prefixes, needle))
+        found = set(prefix)
+        suffix = sorted(
+            (position for position in self._scan(snapshot.suffixes,
+                                                 needle[::-1])
+             if position not in found),
+            key=names.__getitem__,
+        )
+        return [items[position] for position in prefix + suffix]
+
+    def _get_snapshot(self):
+        version = get_version(INGREDIENTS)
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot, version):
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if not self._is_fresh(snapshot, version):
+                snapshot = self._snapshot = self._build(version)
+            return snapshot
+
+    @staticmethod
+    def _is_fresh(snapshot, version):
+        return (snapshot is not None and snapshot.version == version
+                and time.monotonic() - snapshot.built_at
+                < settings.INGREDIENT_INDEX_TTL)
+
+    @staticmethod
+    def _build(version):
+        with read_from_primary():
+            items = list(IngredientModel.objects.order_by('id').values(
+                'id', 'name', 'measurement_unit'))
+        names = [normalize(item['name']) for item in items]
+        return _Snapshot(
+            version=version,
+            built_at=time.monotonic(),
+            items=items,
+            names=names,
+            prefixes=sorted((name, position)
+                            for position, name in enumerate(names)),
+            suffixes=sorted((name[::-1], position)
+                            for position, name in enumerate(names)),
+        )
+
+    @staticmethod
+    def _scan(keys, needle):
+        """Позиции ключей, начинающихся с needle, в порядке ключей."""
+        index = bisect.bisect_left(keys, (needle,))
+        while index < len(keys) and keys[index][0].startswith(needle):
+            yield keys[index][1]
+            index += 1
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,113 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import transaction
+
+from profile_user.models import FavoriteModel, FollowModel, ShoppingCartModel
+
+from .filterset import RecipeFilter
+
+RECIPES = 'recipes'
+INGREDIENTS = 'ingredients'
+TAGS = 'tags'
+USER_FILTER_PARAMS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def get_version(name: str) -> float:
+    """
+    Текущая версия набора данных (время последнего изменения).
+
+    С LocMemCache версия живет CACHE_VERSION_TIMEOUT: если изменение
+    сделано в процессе, чей кэш не виден этому, данные обновятся
+    после истечения версии. В общем кэше версия не истекает.
+    """
+    key = f'version:{name}'
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time(), settings.CACHE_VERSION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name: str) -> None:
+    """
+    Сдвигает версию, делая устаревшими все ключи этого набора.
+
+    Версия сдвигается после фиксации текущей транзакции: иначе
+    запрос, прочитавший данные до фиксации, закэшировал бы их
+    под новой версией. Вне транзакции версия сдвигается сразу.
+    """
+    transaction.on_commit(lambda: cache.set(
+        f'version:{name}', time.time(), settings.CACHE_VERSION_TIMEOUT))
+
+
+def recipe_list_cache_key(request):
+    """
+    Ключ кэша списка рецептов по параметрам запроса.
+
+    Для фильтров по избранному и корзине список зависит от пользователя,
+    такие запросы не кэшируются.
+    """
+    params = request.query_params
+    if any(params.get(param) in RecipeFilter.true_values
+           for param in USER_FILTER_PARAMS):
+        return None
+    query = "&".join(
+        f"{key}={value}"
+        for key in sorted(params) for value in sorted(params.getlist(key))
+    )
+    digest = hashlib.md5(
+        f"{request.build_absolute_uri('/')}?{query}".encode()).hexdigest()
+    return f'{RECIPES}:{get_version(RECIPES)}:{digest}'
+
+
+def get_cached_recipe_list(cache_key):
+    return cache.get(cache_key)
+
+
+def set_cached_recipe_list(cache_key, data):
+    cache.set(cache_key, data, settings.RECIPE_LIST_CACHE_TIMEOUT)
+
+
+def user_flag_lookups(recipes, user):
+    """
+    Запросы id для флагов пользователя.
+
+    Возвращает три функции: id рецептов в избранном, id рецептов
+    в корзине и id авторов в подписках. Запросы независимы,
+    поэтому их можно выполнять параллельно.
+    """
+    recipe_ids = [recipe['id'] for recipe in recipes]
+    author_ids = {recipe['author']['id'] for recipe in recipes}
+    return (
+        lambda: set(FavoriteModel.objects.filter(
+            user=user, recipe_id__in=recipe_ids
+        ).values_list('recipe_id', flat=True)),
+        lambda: set(ShoppingCartModel.objects.filter(
+            user=user, recipe_id__in=recipe_ids
+        ).values_list('recipe_id', flat=True)),
+        lambda: set(FollowModel.objects.filter(
+            user=user, follower_id__in=author_ids
+        ).values_list('follower_id', flat=True)),
+    )
+
+
+def set_user_flags(recipes, favorites, shopping, subscriptions):
+    """Проставляет флаги по уже полученным наборам id."""
+    for recipe in recipes:
+        recipe['is_favorited'] = recipe['id'] in favorites
+        recipe['is_in_shopping_cart'] = recipe['id'] in shopping
+        recipe['author']['is_subscribed'] = (
+            recipe['author']['id'] in subscriptions)
+    return recipes
+
+
+def apply_user_flags(recipes, user):
+    """Проставляет в сериализованные рецепты флаги пользователя."""
+    if isinstance(user, AnonymousUser) or not recipes:
+        return recipes
+    return set_user_flags(recipes, *(
+        lookup() for lookup in user_flag_lookups(recipes, user)))
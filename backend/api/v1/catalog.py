@@ -0,0 +1,89 @@
+"""
+Кэширование ответов справочников (теги, ингредиенты).
+
+Ответ справочника зависит только от версии данных и от адреса запроса,
+поэтому готовые байты JSON хранятся в памяти процесса, а ETag
+и Last-Modified вычисляются без обращения к базе. Версия берется
+из api.v1.cache и сдвигается сигналами при изменении моделей.
+С LocMemCache готовые ответы, как и версии, живут не дольше
+CACHE_VERSION_TIMEOUT, поэтому изменения, сделанные другим процессом,
+не теряются.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+
+from core.db import read_from_primary
+from .cache import get_version
+
+_lock = threading.Lock()
+_store = {}
+
+
+def _is_current(entry, version):
+    timeout = settings.CACHE_VERSION_TIMEOUT
+    return (entry is not None and entry[0] == version
+            and (timeout is None or time.monotonic() - entry[1] < timeout))
+
+
+def _get_body(name, version, key):
+    with _lock:
+        entry = _store.get(name)
+        if not _is_current(entry, version):
+            return None
+        body = entry[2].get(key)
+        if body is not None:
+            entry[2].move_to_end(key)
+        return body
+
+
+def _set_body(name, version, key, body):
+    with _lock:
+        entry = _store.get(name)
+        if not _is_current(entry, version):
+            entry = _store[name] = (version, time.monotonic(), OrderedDict())
+        entry[2][key] = body
+        if len(entry[2]) > settings.CATALOG_CACHE_ENTRIES:
+            entry[2].popitem(last=False)
+
+
+def catalog_response(request, name, build):
+    """
+    Ответ справочника name с поддержкой условных запросов.
+
+    build() строит обычный ответ DRF и вызывается, только если
+    готового JSON для этой версии и адреса еще нет. Для браузерного
+    API и ответов с ошибкой кэш не используется.
+    """
+    if request.accepted_renderer.format != 'json':
+        return build()
+    version = get_version(name)
+    key = request.get_full_path()
+    etag = '"%s"' % hashlib.md5(f'{version}:{key}'.encode()).hexdigest()
+    last_modified = int(version)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is None:
+        body = _get_body(name, version, key)
+        if body is None:
+            with read_from_primary():
+                drf_response = build()
+            if drf_response.status_code != 200:
+                return drf_response
+            body = JSONRenderer().render(drf_response.data)
+            _set_body(name, version, key, body)
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(
+        response, public=True, max_age=settings.CATALOG_CACHE_MAX_AGE)
+    patch_vary_headers(response, ('Accept',))
+    return response
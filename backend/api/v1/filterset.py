@@ -1,5 +1,9 @@
-from django.db.models import Q
-from recipe.models import RecipeModel
+from core.exception import BadRequest
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import Case, Exists, IntegerField, OuterRef, Q, When
+from profile_user.models import FavoriteModel, ShoppingCartModel
+from recipe.models import TagRecipeModel
+from recipe.search import search_recipe_ids
 from rest_framework.filters import BaseFilterBackend
 
 
@@ -16,37 +20,73 @@ class IngredientFilter(BaseFilterBackend):
         return queryset
 
 
-class TagsRecipeFilter(BaseFilterBackend):
-    """Фильтрация рецептов по тегу."""
+class RecipeFilter(BaseFilterBackend):
+    """
+    Фильтрация рецептов по тегам, автору, избранному и корзине.
+
+    Каждое условие добавляется подзапросом EXISTS, поэтому фильтры
+    свободно комбинируются без соединений и DISTINCT. Параметр
+    tags_mode=all оставляет рецепты со всеми тегами, any (по умолчанию)
+    хотя бы с одним.
+    """
+
+    tags_modes = ('any', 'all')
+    true_values = ('1', 'true', 'True')
 
     def filter_queryset(self, request, queryset, view):
-        if request.query_params.get('tags'):
-            tags_list = request.query_params.getlist('tags')
-            queryset = queryset.filter(tags__slug__in=tags_list).distinct()
+        params = request.query_params
+        tags = [tag for tag in params.getlist('tags') if tag]
+        if tags:
+            queryset = self.filter_tags(
+                queryset, tags, params.get('tags_mode', 'any'))
+        author = params.get('author')
+        if author:
+            if not author.isdigit():
+                raise BadRequest({"errors": "Некорректный id автора."})
+            queryset = queryset.filter(author_id=author)
+        for param, model in (('is_favorited', FavoriteModel),
+                             ('is_in_shopping_cart', ShoppingCartModel)):
+            if params.get(param) not in self.true_values:
+                continue
+            if isinstance(request.user, AnonymousUser):
+                return queryset.none()
+            queryset = queryset.filter(Exists(model.objects.filter(
+                recipe=OuterRef('pk'), user=request.user)))
         return queryset
 
+    def filter_tags(self, queryset, tags, mode):
+        if mode not in self.tags_modes:
+            raise BadRequest(
+                {"errors": "tags_mode должен быть any или all."})
+        if mode == 'any':
+            return queryset.filter(Exists(TagRecipeModel.objects.filter(
+                recipe=OuterRef('pk'), tag_id__in=tags)))
+        for tag in set(tags):
+            queryset = queryset.filter(Exists(TagRecipeModel.objects.filter(
+                recipe=OuterRef('pk'), tag_id=tag)))
+        return queryset
 
-class FavoriteRecipeFilter(BaseFilterBackend):
-    """Фильтрация рецептов по избранному."""
 
-    def filter_queryset(self, request, queryset, view):
-        if request.query_params.get('is_favorited'):
-            user = request.user
-            queryset_2 = (
-                RecipeModel.objects.prefetch_related(
-                    'favorites').filter(favorites__user=user)).distinct()
-            queryset = queryset_2 & queryset.distinct()
-        return queryset
+# Позиция рецепта в выдаче поиска, по ней же идет курсорная пагинация.
+SEARCH_RANK = 'search_rank'
+
 
+class RecipeSearchFilter(BaseFilterBackend):
+    """Полнотекстовый поиск рецептов с сортировкой по релевантности."""
 
-class ShoppingRecipeFilter(BaseFilterBackend):
-    """Фильтрация рецептов по корзине покупок."""
+    search_param = 'search'
 
     def filter_queryset(self, request, queryset, view):
-        if request.query_params.get('is_in_shopping_cart'):
-            user = request.user
-            queryset_2 = (
-                RecipeModel.objects.prefetch_related(
-                    'shopping').filter(shopping__user=user)).distinct()
-            queryset = queryset_2 & queryset.distinct()
-        return queryset
+        query = request.query_params.get(self.search_param)
+        if not query:
+            return queryset
+        recipe_ids = search_recipe_ids(query)
+        if not recipe_ids:
+            return queryset.none()
+        ranking = Case(
+            *(When(id=recipe_id, then=position)
+              for position, recipe_id in enumerate(recipe_ids)),
+            output_field=IntegerField(),
+        )
+        return queryset.filter(id__in=recipe_ids).annotate(
+            **{SEARCH_RANK: ranking}).order_by(SEARCH_RANK)
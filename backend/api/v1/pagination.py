@@ -1,8 +1,57 @@
 from rest_framework import pagination
 from rest_framework.response import Response
 
+from .filterset import SEARCH_RANK
+
 
 class CustomPagination(pagination.LimitOffsetPagination):
     """Убирает лишние поля next, count, previous при пагинации."""
     def get_paginated_response(self, data):
         return Response(data)
+
+
+class IdCursorPagination(pagination.CursorPagination):
+    """
+    Курсорная пагинация по убыванию id.
+
+    Результаты поиска идут по релевантности: курсор строится
+    по позиции рецепта в выдаче.
+    """
+
+    ordering = '-id'
+    page_size_query_param = 'limit'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        if SEARCH_RANK in queryset.query.annotations:
+            return (SEARCH_RANK,)
+        return super().get_ordering(request, queryset, view)
+
+
+class LimitOffsetCursorPagination(pagination.LimitOffsetPagination):
+    """
+    Пагинация limit/offset с переключением на курсорную.
+
+    Курсорный режим включается параметром pagination=cursor (его сохраняют
+    ссылки next/previous) или переданным cursor. В нем стоимость страницы
+    не зависит от ее номера, а в ответе есть next и previous без count.
+    Без этих параметров поведение прежнее.
+    """
+
+    mode_query_param = 'pagination'
+    cursor_pagination_class = IdCursorPagination
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (request.query_params.get(self.mode_query_param) == 'cursor'
+                or self.cursor_pagination_class.cursor_query_param
+                in request.query_params):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
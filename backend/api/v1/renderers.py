@@ -0,0 +1,122 @@
+import csv
+import json
+import os
+
+from django.conf import settings
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+from rest_framework.renderers import BaseRenderer
+
+
+class ShoppingCartRenderer(BaseRenderer):
+    """
+    Базовый рендерер списка покупок.
+
+    Вместо render() отдает генератор кусков файла по строкам
+    агрегированного списка, чтобы ответ можно было стримить.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            # Ответы с ошибками (401, 404) приходят словарем
+            # и отдаются как JSON с соответствующим типом.
+            response = (renderer_context or {}).get('response')
+            if response is not None:
+                response['Content-Type'] = 'application/json; charset=utf-8'
+            return json.dumps(data, ensure_ascii=False).encode('utf-8')
+        return b"".join(self.stream(data))
+
+    def stream(self, rows):
+        raise NotImplementedError('stream() must be implemented.')
+
+    def get_filename(self):
+        return f'file.{self.format}'
+
+
+class ShoppingCartTextRenderer(ShoppingCartRenderer):
+    """Список покупок в виде текстового файла."""
+
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        for row in rows:
+            yield (f"{row['name']} ({row['measurement_unit']}) — "
+                   f"{row['amount']} \n").encode(self.charset)
+
+
+class _Echo:
+    """Псевдо-буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingCartCSVRenderer(ShoppingCartRenderer):
+    """Список покупок в формате CSV."""
+
+    media_type = 'text/csv'
+    format = 'csv'
+    header = ('name', 'measurement_unit', 'amount')
+
+    def stream(self, rows):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(self.header).encode(self.charset)
+        for row in rows:
+            yield writer.writerow(
+                [row[field] for field in self.header]).encode(self.charset)
+
+
+class ShoppingCartJSONRenderer(ShoppingCartRenderer):
+    """Список покупок в формате JSON (массив объектов)."""
+
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, rows):
+        separator = b"["
+        for row in rows:
+            yield separator + json.dumps(
+                row, ensure_ascii=False).encode(self.charset)
+            separator = b","
+        yield b"[]" if separator == b"[" else b"]"
+
+
+class ShoppingCartPDFRenderer(ShoppingCartRenderer):
+    """
+    Список покупок в PDF (fpdf2).
+
+    Шрифт SHOPPING_CART_PDF_FONT встраивается в файл подмножеством
+    использованных глифов, поэтому кириллица читается в любом
+    просмотрщике. Без файла шрифта формат недоступен.
+    """
+
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_family = 'ShoppingCart'
+    font_size = 12
+    line_height = 15
+    margin = 56
+
+    @staticmethod
+    def is_available():
+        return os.path.isfile(settings.SHOPPING_CART_PDF_FONT)
+
+    def stream(self, rows):
+        # fpdf2 собирает документ целиком, строки по-прежнему
+        # читаются из базы итератором.
+        pdf = FPDF(unit='pt', format='A4')
+        pdf.set_margins(self.margin, self.margin)
+        pdf.set_auto_page_break(True, self.margin)
+        pdf.add_font(self.font_family, fname=settings.SHOPPING_CART_PDF_FONT)
+        pdf.set_font(self.font_family, size=self.font_size)
+        pdf.add_page()
+        for row in rows:
+            pdf.cell(0, self.line_height,
+                     f"{row['name']} ({row['measurement_unit']}) — "
+                     f"{row['amount']}",
+                     new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        yield bytes(pdf.output())
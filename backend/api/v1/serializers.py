@@ -1,15 +1,25 @@
 import base64
+import binascii
+import json
+from io import BytesIO
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
-from django.core.files.base import ContentFile
-from django.shortcuts import get_object_or_404
+from django.core.files.uploadedfile import (InMemoryUploadedFile,
+                                            TemporaryUploadedFile)
+from django.core.files.storage import default_storage
+from django.db import transaction
 from rest_framework import serializers
 from django.core.validators import MinValueValidator
+from django.http import QueryDict
+from PIL import Image
 
 from profile_user.models import FavoriteModel, FollowModel, ShoppingCartModel
 from recipe.models import (IngredientModel, IngredientRecipeModel, RecipeModel,
                            TagModel)
+from recipe.images import schedule_renditions, strip_metadata
+from recipe.search import index_recipe
 
 User = get_user_model()
 
@@ -33,12 +43,12 @@ class UserSerializer(serializers.ModelSerializer):
     def get_is_subscribed(self, obj):
         """Получение поля подписки."""
         user = self.context.get('request').user
-        if isinstance(user, AnonymousUser):
+        if (isinstance(user, AnonymousUser)
+                or not self.context.get('user_flags', True)):
             return False
-        model = FollowModel.objects.filter(follower=obj, user=user)
-        if model:
-            return True
-        return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return FollowModel.objects.filter(follower=obj, user=user).exists()
 
     def to_internal_value(self, data):
         user = self.context.get('request').user
@@ -73,21 +83,98 @@ class IngredientRecipeSerializer(serializers.ModelSerializer):
         model = IngredientRecipeModel
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
-    def validate_id(self, value):
-        get_object_or_404(IngredientModel, id=value)
-        return value
-
 
 class Base64ImageField(serializers.ImageField):
-    """Поле для картинок."""
+    """
+    Поле для картинок.
+
+    Принимает файл из multipart-формы или строку data:image/...;base64.
+    Строка декодируется частями во временный файл, который держится
+    в памяти только до FILE_UPLOAD_MAX_MEMORY_SIZE. Размер файла
+    проверяется до декодирования, число пикселей — по заголовку
+    картинки, до распаковки. Сохраняется копия фото без метаданных.
+    """
+
+    default_error_messages = {
+        'invalid_base64': 'Некорректная строка base64.',
+        'too_large': 'Размер фото не должен превышать {max_size} байт.',
+        'too_many_pixels': 'Фото не должно превышать {max_pixels} пикселей.',
+    }
+    # Кратно 4, чтобы каждая часть декодировалась независимо.
+    chunk_size = 256 * 1024
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            data = self.decode_base64(data)
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if hasattr(data, 'size') and data.size > max_size:
+            self.fail('too_large', max_size=max_size)
+        self.check_pixels(data)
+        file = super().to_internal_value(data)
+        try:
+            return strip_metadata(file)
+        except (KeyError, OSError, ValueError):
+            # Pillow читает формат, но не умеет его сохранять.
+            self.fail('invalid_image')
+
+    def decode_base64(self, data):
+        """Декодирует data URL во временный файл."""
+        start = data.find(';base64,')
+        if start == -1:
+            self.fail('invalid_base64')
+        content_type = data[len('data:'):start]
+        start += len(';base64,')
+        if (len(data) - start) * 3 // 4 > settings.RECIPE_IMAGE_MAX_SIZE:
+            self.fail('too_large', max_size=settings.RECIPE_IMAGE_MAX_SIZE)
+        name = 'temp.' + content_type.split('/')[-1]
+        if len(data) - start > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            file = TemporaryUploadedFile(name, content_type, 0, None)
+        else:
+            file = InMemoryUploadedFile(
+                BytesIO(), None, name, content_type, 0, None)
+        try:
+            for offset in range(start, len(data), self.chunk_size):
+                file.write(base64.b64decode(
+                    data[offset:offset + self.chunk_size], validate=True))
+        except binascii.Error:
+            file.close()
+            self.fail('invalid_base64')
+        file.size = file.tell()
+        file.seek(0)
+        return file
+
+    def check_pixels(self, file):
+        """Проверяет размеры картинки по заголовку, не распаковывая ее."""
+        if not hasattr(file, 'seek'):
+            return
+        try:
+            with Image.open(file) as image:
+                width, height = image.size
+        except Exception:
+            # Некорректный файл отклонит проверка ImageField.
+            return
+        finally:
+            file.seek(0)
+        if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            self.fail('too_many_pixels',
+                      max_pixels=settings.RECIPE_IMAGE_MAX_PIXELS)
+
+
+class ImageRenditionsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии фото по размерам и форматам."""
 
-        return super().to_internal_value(data)
+    def to_representation(self, value):
+        storage = default_storage
+        request = self.context.get('request')
+        renditions = {}
+        for name, formats in value.items():
+            renditions[name] = {}
+            for image_format, path in formats.items():
+                url = storage.url(path)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                renditions[name][image_format] = url
+        return renditions
 
 
 class TagPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
@@ -104,6 +191,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     ingredients = IngredientRecipeSerializer(many=True, required=True,
                                              source='ingredient_recipe')
     image = Base64ImageField(allow_null=False, required=False,)
+    image_renditions = ImageRenditionsField()
     is_favorited = serializers.SerializerMethodField(read_only=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
     cooking_time = serializers.IntegerField(
@@ -121,6 +209,7 @@ class RecipeSerializer(serializers.ModelSerializer):
                   'name',
                   'text',
                   'image',
+                  'image_renditions',
                   'cooking_time',
                   'tags',
                   'ingredients',
@@ -128,77 +217,132 @@ class RecipeSerializer(serializers.ModelSerializer):
                   'is_in_shopping_cart',
                   )
 
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            image = self.validated_data.get('image')
+            if image is not None:
+                # Временный файл с декодированным фото больше не нужен.
+                image.close()
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop("ingredient_recipe")
         tags = validated_data.pop('tags')
         recipe = RecipeModel.objects.create(**validated_data)
         recipe.tags.set(tags)
         self.save_ingredinets(ingredients, recipe)
+        index_recipe(recipe)
+        schedule_renditions(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop("ingredient_recipe")
         tags = validated_data.pop('tags')
-        instance.ingredients.clear()
         instance.tags.set(tags)
         self.save_ingredinets(ingredients, instance)
-        return super().update(instance, validated_data)
+        # Сохранение рецепта обновляет updated_at (auto_now) один раз
+        # за запрос, как бы ни менялись теги и ингредиенты.
+        instance = super().update(instance, validated_data)
+        index_recipe(instance)
+        if 'image' in validated_data:
+            schedule_renditions(instance)
+        return instance
 
     def get_is_favorited(self, obj):
         """Получение поля избранного."""
         user = self.context.get('request').user
-        if isinstance(user, AnonymousUser):
+        if (isinstance(user, AnonymousUser)
+                or not self.context.get('user_flags', True)):
             return False
-        model = FavoriteModel.objects.filter(recipe=obj, user=user)
-        if model:
-            return True
-        return False
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        return FavoriteModel.objects.filter(recipe=obj, user=user).exists()
 
     def get_is_in_shopping_cart(self, obj):
         """Получение поля покупки."""
         user = self.context.get('request').user
-        if isinstance(user, AnonymousUser):
+        if (isinstance(user, AnonymousUser)
+                or not self.context.get('user_flags', True)):
             return False
-        model = ShoppingCartModel.objects.filter(recipe=obj, user=user)
-        if model:
-            return True
-        return False
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        return ShoppingCartModel.objects.filter(
+            recipe=obj, user=user).exists()
+
+    def to_internal_value(self, data):
+        if isinstance(data, QueryDict):
+            # В multipart-форме теги передаются списком значений,
+            # а ингредиенты — JSON-строкой.
+            data = {key: data.getlist(key) if key == 'tags' else data[key]
+                    for key in data}
+            if isinstance(data.get('ingredients'), str):
+                try:
+                    data['ingredients'] = json.loads(data['ingredients'])
+                except ValueError:
+                    raise serializers.ValidationError(
+                        {'ingredients': 'Ожидается JSON-список.'})
+        return super().to_internal_value(data)
+
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
 
     def validate_ingredients(self, value):
-        """Валидация ингредиентов."""
-        indx_list = []
+        """Валидация ингредиентов одним запросом к базе."""
+        indx_list = [ingredient['ingredient']['id'] for ingredient in value]
+        if len(set(indx_list)) != len(indx_list):
+            raise serializers.ValidationError(
+                "Не должно быть одинаковых ингредиентов.")
+        ingredient_models = IngredientModel.objects.in_bulk(indx_list)
+        missing = [indx for indx in indx_list
+                   if indx not in ingredient_models]
+        if missing:
+            raise serializers.ValidationError(
+                f"Ингредиенты не найдены: {missing}.")
         for ingredient in value:
-            ingr_indx = ingredient['ingredient']['id']
-            if ingr_indx in indx_list:
-                raise serializers.ValidationError(
-                    "Не должно быть одинаковых ингредиентов.")
-            indx_list.append(ingr_indx)
+            ingredient['ingredient'] = ingredient_models[
+                ingredient['ingredient']['id']]
         return value
 
     def save_ingredinets(self, ingredients, recipe):
-        """Создаем и сохраняет ингредиента для рецепта."""
-
-        ingredient_recipe_model_list = []
+        """
+        Сохраняет ингредиенты рецепта.
+
+        Изменяются только отличающиеся строки: лишние удаляются,
+        новые добавляются, у оставшихся обновляется количество.
+        """
+        current = {ingredient_recipe.ingredient_id: ingredient_recipe
+                   for ingredient_recipe in recipe.ingredient_recipe.all()}
+        to_create = []
+        to_update = []
         for ingredient in ingredients:
-            ingr_id = ingredient['ingredient'].pop("id")
-            amount = ingredient['amount']
-            ingredient_model = IngredientModel.objects.get(id=ingr_id)
-            ingredient_recipe_model = IngredientRecipeModel(
-                recipe=recipe, ingredient=ingredient_model, amount=amount
-            )
-            ingredient_recipe_model_list.append(ingredient_recipe_model)
-
-        recipe.ingredient_recipe.set(
-            ingredient_recipe_model_list, bulk=False
-        )
+            ingredient_recipe = current.pop(ingredient['ingredient'].id, None)
+            if ingredient_recipe is None:
+                to_create.append(IngredientRecipeModel(
+                    recipe=recipe, ingredient=ingredient['ingredient'],
+                    amount=ingredient['amount']))
+            elif ingredient_recipe.amount != ingredient['amount']:
+                ingredient_recipe.amount = ingredient['amount']
+                to_update.append(ingredient_recipe)
+        if current:
+            IngredientRecipeModel.objects.filter(
+                id__in=[row.id for row in current.values()]).delete()
+        IngredientRecipeModel.objects.bulk_create(to_create)
+        IngredientRecipeModel.objects.bulk_update(to_update, ['amount'])
 
 
 class RecipeTwoSerializer(serializers.ModelSerializer):
     """Вспомогательный сериализатор. Отвечает только за визуализацию."""
 
+    image_renditions = ImageRenditionsField()
+
     class Meta:
         model = RecipeModel
-        fields = ('id', 'name', 'image', 'cooking_time',)
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time',)
 
 
 class FollowSerializer(serializers.ModelSerializer):
@@ -214,17 +358,23 @@ class FollowSerializer(serializers.ModelSerializer):
 
     def get_recipes_count(self, obj):
         """Получения поля кол-ва рецептов."""
-        count_queryset = self.recipe_queryset.count()
-        return count_queryset
+        return obj.follower.recipes_count
 
     def get_recipes(self, obj):
         """Получения поля рецептов."""
         author = obj.follower
-        self.recipe_queryset = RecipeModel.objects.filter(author=author)
-        serializer = RecipeTwoSerializer(self.recipe_queryset, many=True)
+        recipes = getattr(author, 'limited_recipes', None)
+        if recipes is None:
+            recipes = author.recipes.all()
+            recipes_limit = self.context.get('recipes_limit')
+            if recipes_limit:
+                recipes = recipes[:recipes_limit]
+        serializer = RecipeTwoSerializer(recipes, many=True)
         return serializer.data
 
     def to_representation(self, value):
+        if value.user_id == self.context.get('request').user.id:
+            value.follower.is_subscribed = True
         value_dict = dict(super().to_representation(value))
         follower_dict = value_dict.pop("follower")
         result_dict = {**value_dict, **follower_dict}
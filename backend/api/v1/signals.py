@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from recipe.models import IngredientModel, RecipeModel, TagModel
+from recipe.signals import is_author_change
+from .cache import INGREDIENTS, RECIPES, TAGS, bump_version
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=RecipeModel)
+@receiver(m2m_changed, sender=RecipeModel.tags.through)
+def invalidate_recipe_list(**kwargs):
+    """Сбрасывает кэш списка рецептов при изменении рецептов."""
+    bump_version(RECIPES)
+
+
+@receiver([post_save, post_delete], sender=IngredientModel)
+def invalidate_ingredients(**kwargs):
+    """Сбрасывает индекс автодополнения и списки рецептов с продуктами."""
+    bump_version(INGREDIENTS)
+    bump_version(RECIPES)
+
+
+@receiver([post_save, post_delete], sender=TagModel)
+def invalidate_tags(**kwargs):
+    """Сбрасывает кэш тегов и списков рецептов, в которые они входят."""
+    bump_version(TAGS)
+    bump_version(RECIPES)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(created, update_fields, **kwargs):
+    """Сбрасывает кэш списка рецептов при изменении данных автора."""
+    if is_author_change(created, update_fields):
+        bump_version(RECIPES)
@@ -0,0 +1,783 @@
+import base64
+import io
+import os
+import re
+import shutil
+import tempfile
+import time
+from unittest import mock
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from core.management.commands.export import dict_model, main_dir
+from core.db import _use_replica, check_connections, mark_idle_connections
+from core.middleware import DUPLICATES_KEPT, DUPLICATES_LIMIT, QueryStats
+from core.plans import explain, hot_queries
+from profile_user.models import FavoriteModel, FollowModel, ShoppingCartModel
+from profile_user.relations import follows
+from recipe.models import (IngredientModel, IngredientRecipeModel, RecipeModel,
+                           TagModel, TagRecipeModel)
+from recipe.search import index_recipe, search_recipe_ids
+from .autocomplete import ingredient_index
+from .cache import RECIPES, get_version
+from .filterset import RecipeFilter
+from .serializers import Base64ImageField
+from .views import RecipeSet
+
+User = get_user_model()
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def tearDownModule():
+    shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+
+def create_user(username='user'):
+    """Пользователь с паролем pass12345!."""
+    return User.objects.create_user(
+        email=f'{username}@foodgram.ru', username=username,
+        first_name='Имя', last_name='Фамилия', password='pass12345!')
+
+
+def create_recipe(author, name='Рецепт', text='Текст'):
+    """Рецепт без тегов и ингредиентов."""
+    return RecipeModel.objects.create(
+        author=author, name=name, text=text,
+        image='recipe/image/test.png', cooking_time=10)
+
+
+def image_data(size=(4, 4), image_format='PNG', mode='RGB'):
+    """Фото в виде data URI, как его присылает фронтенд."""
+    buffer = io.BytesIO()
+    Image.new(mode, size).save(buffer, image_format)
+    return (f'data:image/{image_format.lower()};base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+class FoodgramTestCase(TestCase):
+    """Пользователь user и клиент, вошедший от его имени, на пустом кэше."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+class QueryCountTests(FoodgramTestCase):
+    """Число SQL-запросов горячих эндпоинтов не зависит от объема данных."""
+
+    def create_recipes(self, count, relations=2):
+        """count рецептов, у каждого relations тегов и ингредиентов."""
+        recipes = []
+        for _ in range(count):
+            number = RecipeModel.objects.count()
+            recipe = create_recipe(self.user, name=f'Рецепт {number}')
+            for index in range(relations):
+                tag = TagModel.objects.create(
+                    name=f'Тег {number}-{index}',
+                    color=f'#{TagModel.objects.count():06X}',
+                    slug=f'tag-{number}-{index}')
+                ingredient = IngredientModel.objects.create(
+                    name=f'Ингредиент {number}-{index}',
+                    measurement_unit='г')
+                TagRecipeModel.objects.create(tag=tag, recipe=recipe)
+                IngredientRecipeModel.objects.create(
+                    ingredient=ingredient, recipe=recipe, amount=index + 1)
+            recipes.append(recipe)
+        return recipes
+
+    def assert_constant_queries(self, queries, prepare, sizes=(1, 10),
+                                client=None):
+        """
+        Запрос выполняет queries SQL-запросов при любом объеме данных.
+
+        prepare(size) готовит данные объема size и возвращает адрес.
+        """
+        client = client or self.client
+        for size in sizes:
+            url = prepare(size)
+            cache.clear()
+            with self.subTest(url=url, size=size), \
+                    self.assertNumQueries(queries):
+                response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+
+    def fill_to(self, model, size):
+        """Дополняет связи пользователя с рецептами model до size."""
+        missing = size - model.objects.filter(user=self.user).count()
+        for recipe in self.create_recipes(missing):
+            model.objects.create(user=self.user, recipe=recipe)
+
+    def test_download_shopping_cart(self):
+        for renderer in ('txt', 'csv', 'json', 'pdf'):
+            ShoppingCartModel.objects.all().delete()
+            url = f'/api/recipes/download_shopping_cart/?format={renderer}'
+            self.assert_constant_queries(
+                1, lambda size: self.fill_to(ShoppingCartModel, size) or url)
+
+    def recipes_to(self, size):
+        """Дополняет рецепты до size и возвращает адрес списка."""
+        self.create_recipes(size - RecipeModel.objects.count())
+        return '/api/recipes/'
+
+    def test_recipe_list(self):
+        # Пользователь: список, флаги избранного, корзины и подписок.
+        self.assert_constant_queries(7, self.recipes_to)
+
+    def test_recipe_list_anonymous(self):
+        self.assert_constant_queries(4, self.recipes_to, client=APIClient())
+
+    def test_recipe_list_favorited(self):
+        # Список зависит от пользователя и собирается без кэша,
+        # флаги приходят подзапросами вместе с рецептами.
+        self.assert_constant_queries(
+            4, lambda size: self.fill_to(FavoriteModel, size)
+            or '/api/recipes/?is_favorited=1')
+
+    def test_recipe_detail(self):
+        # Объем данных — число тегов и ингредиентов рецепта.
+        for client in (self.client, APIClient()):
+            self.assert_constant_queries(
+                4, lambda size: '/api/recipes/%d/' % self.create_recipes(
+                    1, relations=size)[0].pk, client=client)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeWriteTests(FoodgramTestCase):
+    """Запись рецепта не зависит по числу запросов от ингредиентов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tag = TagModel.objects.create(
+            name='Обед', color='#000001', slug='lunch')
+        cls.ingredients = [
+            IngredientModel.objects.create(
+                name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(10)]
+
+    def payload(self, amounts):
+        """Данные рецепта с ингредиентами {номер: количество}."""
+        return {
+            'name': 'Рецепт', 'text': 'Текст', 'cooking_time': 10,
+            'tags': [self.tag.pk],
+            'ingredients': [
+                {'id': self.ingredients[index].pk, 'amount': amount}
+                for index, amount in amounts.items()],
+        }
+
+    def assert_ingredients(self, recipe_id, amounts):
+        rows = IngredientRecipeModel.objects.filter(recipe_id=recipe_id)
+        self.assertEqual(
+            dict(rows.values_list('ingredient_id', 'amount')),
+            {self.ingredients[index].pk: amount
+             for index, amount in amounts.items()})
+
+    def test_create_and_update(self):
+        amounts = {index: 1 for index in range(6)}
+        data = {**self.payload(amounts), 'image': image_data()}
+        # Теги и ингредиенты, рецепт и счетчик автора, теги, одна
+        # вставка ингредиентов, индекс поиска и перечитывание рецепта.
+        with self.assertNumQueries(21):
+            response = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        recipe_id = response.data['id']
+        self.assert_ingredients(recipe_id, amounts)
+
+        # Два остаются, у двух меняется количество, два удаляются,
+        # четыре добавляются: одно удаление, одна вставка, одно
+        # обновление количества и одно обновление рецепта.
+        amounts = {0: 1, 1: 1, 2: 5, 3: 5, 6: 2, 7: 2, 8: 2, 9: 2}
+        with self.assertNumQueries(22):
+            response = self.client.patch(
+                f'/api/recipes/{recipe_id}/', self.payload(amounts),
+                format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assert_ingredients(recipe_id, amounts)
+
+    def test_invalid_image_is_bad_request(self):
+        data = {**self.payload({0: 1}), 'image': 'data:image/png;base64,@'}
+        response = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.data)
+
+
+class Base64ImageFieldTests(TestCase):
+    """Загрузка фото строкой base64."""
+
+    def assert_error(self, data, code):
+        with self.assertRaises(ValidationError) as error:
+            Base64ImageField().run_validation(data)
+        self.assertEqual(error.exception.detail[0].code, code)
+
+    def test_valid_upload_in_chunks(self):
+        data = image_data((300, 200))
+        field = Base64ImageField()
+        field.chunk_size = 64
+        for memory_size in (2 ** 20, 0):
+            with self.subTest(memory_size=memory_size), \
+                    override_settings(FILE_UPLOAD_MAX_MEMORY_SIZE=memory_size):
+                file = field.decode_base64(data)
+                content = base64.b64decode(data.split(',', 1)[1])
+                self.assertEqual(file.size, len(content))
+                self.assertEqual(file.read(), content)
+                file.close()
+                file = field.run_validation(data)
+                self.assertEqual(Image.open(file).size, (300, 200))
+                file.close()
+
+    def test_metadata_stripped(self):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'  # Make
+        exif[0x0112] = 6  # Orientation: повернуть на 90°
+        exif[0x8825] = {1: 'N', 2: (55.0, 45.0, 0.0)}  # GPSInfo
+        buffer = io.BytesIO()
+        Image.new('RGB', (30, 20)).save(buffer, 'JPEG', exif=exif)
+        self.assertIn(b'Camera', buffer.getvalue())
+        file = Base64ImageField().run_validation(
+            'data:image/jpeg;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+        content = file.read()
+        self.assertNotIn(b'Exif', content)
+        self.assertNotIn(b'Camera', content)
+        with Image.open(io.BytesIO(content)) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertEqual(image.size, (20, 30))
+            self.assertFalse(image.getexif())
+
+    @override_settings(RECIPE_IMAGE_MAX_SIZE=1024)
+    def test_oversize_rejected_before_decoding(self):
+        # Строка не base64: ошибка размера показывает, что до
+        # декодирования дело не дошло.
+        self.assert_error('data:image/png;base64,' + '!' * 2000, 'too_large')
+
+    def test_decompression_bomb(self):
+        # 64 млн пикселей в файле на несколько десятков килобайт.
+        self.assert_error(image_data((8000, 8000), mode='1'),
+                          'too_many_pixels')
+
+    def test_malformed_base64(self):
+        self.assert_error('data:image/png;base64,iVBO@@==', 'invalid_base64')
+        self.assert_error('data:image/png,iVBORw0KGgo=', 'invalid_base64')
+
+
+class ShoppingCartRendererTests(FoodgramTestCase):
+    """Форматы выгрузки списка покупок."""
+
+    url = '/api/recipes/download_shopping_cart/?format=%s'
+
+    def test_error_is_json(self):
+        for renderer in ('txt', 'csv', 'pdf'):
+            with self.subTest(format=renderer):
+                response = APIClient().get(self.url % renderer)
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(response['Content-Type'],
+                                 'application/json; charset=utf-8')
+
+    def test_pdf_embeds_font(self):
+        if not os.path.isfile(settings.SHOPPING_CART_PDF_FONT):
+            self.skipTest('Нет файла шрифта SHOPPING_CART_PDF_FONT.')
+        recipe = create_recipe(self.user)
+        ingredient = IngredientModel.objects.create(
+            name='Молоко', measurement_unit='мл')
+        IngredientRecipeModel.objects.create(
+            recipe=recipe, ingredient=ingredient, amount=200)
+        ShoppingCartModel.objects.create(user=self.user, recipe=recipe)
+        response = self.client.get(self.url % 'pdf')
+        content = b''.join(response.streaming_content)
+        self.assertTrue(content.startswith(b'%PDF-'))
+        self.assertIn(b'/FontFile2', content)
+        self.assertIn(b'/ToUnicode', content)
+
+    @override_settings(SHOPPING_CART_PDF_FONT='/nonexistent.ttf')
+    def test_pdf_unavailable_without_font(self):
+        self.assertEqual(self.client.get(self.url % 'pdf').status_code, 404)
+        self.assertEqual(self.client.get(self.url % 'txt').status_code, 200)
+
+
+class CacheVersionTests(FoodgramTestCase):
+    """Версии кэша сдвигаются только после фиксации транзакции."""
+
+    def test_recipe_version_bumped_on_commit(self):
+        version = get_version(RECIPES)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_recipe(self.user)
+            self.assertEqual(get_version(RECIPES), version)
+        self.assertNotEqual(get_version(RECIPES), version)
+
+
+class CatalogCacheTests(FoodgramTestCase):
+    """Срок жизни версий и готовых ответов справочников."""
+
+    def get_later(self, client, url, seconds, **headers):
+        later = time.time() + seconds
+        monotonic = time.monotonic() + seconds
+        with mock.patch('time.time', return_value=later), \
+                mock.patch('time.monotonic', return_value=monotonic):
+            return client.get(url, **headers)
+
+    def test_change_from_other_process_expires(self):
+        TagModel.objects.create(name='Завтрак', color='#000001', slug='a')
+        client = APIClient()
+        self.assertEqual(len(client.get('/api/tags/').json()), 1)
+        # Версия не сдвигается: так выглядит изменение из процесса
+        # с другим кэшем.
+        TagModel.objects.create(name='Обед', color='#000002', slug='b')
+        self.assertEqual(len(client.get('/api/tags/').json()), 1)
+
+        response = self.get_later(
+            client, '/api/tags/', settings.CACHE_VERSION_TIMEOUT + 1)
+        self.assertEqual(len(response.json()), 2)
+
+    @override_settings(CACHE_VERSION_TIMEOUT=None)
+    def test_shared_cache_version_does_not_expire(self):
+        TagModel.objects.create(name='Завтрак', color='#000001', slug='a')
+        client = APIClient()
+        etag = client.get('/api/tags/')['ETag']
+        response = self.get_later(
+            client, '/api/tags/', 24 * 60 * 60, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class RecipeETagTests(FoodgramTestCase):
+    """ETag рецепта меняется вместе с вложенными данными."""
+
+    def test_embedded_changes_update_etag(self):
+        recipe = create_recipe(self.user)
+        tag = TagModel.objects.create(name='Обед', color='#000001', slug='a')
+        ingredient = IngredientModel.objects.create(
+            name='молоко', measurement_unit='г')
+        TagRecipeModel.objects.create(tag=tag, recipe=recipe)
+        IngredientRecipeModel.objects.create(
+            ingredient=ingredient, recipe=recipe, amount=1)
+        client = APIClient()
+        url = f'/api/recipes/{recipe.pk}/'
+
+        def change(obj, field, value):
+            etag = client.get(url)['ETag']
+            setattr(obj, field, value)
+            obj.save()
+            response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+        change(tag, 'name', 'Ужин')
+        change(ingredient, 'measurement_unit', 'мл')
+        change(self.user, 'first_name', 'Другое')
+
+        etag = client.get(url)['ETag']
+        tag.delete()
+        self.assertNotEqual(client.get(url)['ETag'], etag)
+
+
+class CounterTests(FoodgramTestCase):
+    """Денормализованные счетчики при изменениях мимо API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.author = create_user('author')
+        cls.recipe = create_recipe(cls.author)
+
+    def test_orm_relations_are_counted(self):
+        FavoriteModel.objects.create(user=self.user, recipe=self.recipe)
+        ShoppingCartModel.objects.create(user=self.user, recipe=self.recipe)
+        FollowModel.objects.create(user=self.user, follower=self.author)
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.recipe.shopping_count, 1)
+        self.assertEqual(self.author.subscribers_count, 1)
+        self.assertEqual(self.author.recipes_count, 1)
+
+        url = f'/api/recipes/{self.recipe.pk}/favorite/'
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.recipe.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 0)
+
+    def test_drifted_counter_does_not_fail(self):
+        FavoriteModel.objects.create(user=self.user, recipe=self.recipe)
+        RecipeModel.objects.filter(pk=self.recipe.pk).update(
+            favorites_count=0)
+        url = f'/api/recipes/{self.recipe.pk}/favorite/'
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertFalse(FavoriteModel.objects.exists())
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+
+class RelationTests(FoodgramTestCase):
+    """Избранное, корзина и подписки через INSERT/DELETE ... RETURNING."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.author = create_user('author')
+        cls.recipes = [create_recipe(cls.author, f'Рецепт {index}')
+                       for index in range(2)]
+
+    def counter(self, obj, name):
+        obj.refresh_from_db()
+        return getattr(obj, name)
+
+    def test_single_relations(self):
+        recipe = self.recipes[0]
+        for url, target, counter in (
+                (f'/api/recipes/{recipe.pk}/favorite/', recipe,
+                 'favorites_count'),
+                (f'/api/recipes/{recipe.pk}/shopping_cart/', recipe,
+                 'shopping_count'),
+                (f'/api/users/{self.author.pk}/subscribe/', self.author,
+                 'subscribers_count')):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.post(url).status_code, 201)
+                self.assertEqual(self.client.post(url).status_code, 400)
+                self.assertEqual(self.counter(target, counter), 1)
+                self.assertEqual(self.client.delete(url).status_code, 204)
+                self.assertEqual(self.client.delete(url).status_code, 404)
+                self.assertEqual(self.counter(target, counter), 0)
+
+    def test_missing_target(self):
+        for url in ('/api/recipes/999/favorite/',
+                    '/api/recipes/999/shopping_cart/',
+                    '/api/users/999/subscribe/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.post(url).status_code, 404)
+        self.assertEqual(follows.add(self.user, [self.user.pk]), [])
+
+    def test_bulk_relations(self):
+        ids = [recipe.pk for recipe in self.recipes]
+        url = '/api/recipes/favorite/'
+        response = self.client.post(
+            url, {'recipes': [*ids, 999]}, format='json')
+        self.assertEqual(response.data, {'added': ids, 'skipped': [999]})
+        response = self.client.post(url, {'recipes': ids}, format='json')
+        self.assertEqual(response.data, {'added': [], 'skipped': ids})
+        response = self.client.delete(
+            url, {'recipes': [ids[0], 999]}, format='json')
+        self.assertEqual(response.data,
+                         {'removed': [ids[0]], 'skipped': [999]})
+        self.assertEqual(
+            [self.counter(recipe, 'favorites_count')
+             for recipe in self.recipes], [0, 1])
+
+
+class SubscriptionTests(FoodgramTestCase):
+    """Подписки с последними рецептами авторов."""
+
+    url = '/api/users/subscriptions/'
+
+    def follow(self, recipes):
+        """Автор с recipes рецептами, на которого подписан user."""
+        author = create_user(f'author{User.objects.count()}')
+        for index in range(recipes):
+            create_recipe(author, f'Рецепт {index}')
+        FollowModel.objects.create(user=self.user, follower=author)
+        return author
+
+    def test_recipes_limit(self):
+        authors = [self.follow(count) for count in (0, 2, 5)]
+        results = {
+            item['id']: item for item in self.client.get(
+                self.url, {'recipes_limit': 3, 'limit': 10}).data['results']}
+        for author in authors:
+            latest = list(RecipeModel.objects.filter(
+                author=author).order_by('-id').values_list('id', flat=True))
+            with self.subTest(recipes=len(latest)):
+                item = results[author.pk]
+                self.assertEqual([recipe['id'] for recipe in item['recipes']],
+                                 latest[:3])
+                self.assertEqual(item['recipes_count'], len(latest))
+
+    def test_constant_queries(self):
+        for authors in (1, 5):
+            while FollowModel.objects.count() < authors:
+                self.follow(4)
+            with self.subTest(authors=authors), self.assertNumQueries(3):
+                response = self.client.get(
+                    self.url, {'recipes_limit': 2, 'limit': 10})
+                self.assertEqual(len(response.data['results']), authors)
+
+    def test_bad_recipes_limit(self):
+        for value in ('0', '-1', 'abc', '1.5'):
+            with self.subTest(recipes_limit=value):
+                response = self.client.get(
+                    self.url, {'recipes_limit': value})
+                self.assertEqual(response.status_code, 400)
+
+
+class IngredientIndexTests(FoodgramTestCase):
+    """Автодополнение ингредиентов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for name in ('молоко', 'сгущенное молоко', 'масло'):
+            IngredientModel.objects.create(name=name, measurement_unit='г')
+
+    def test_search_prefix_then_suffix(self):
+        names = [item['name'] for item in ingredient_index.search('Мол')]
+        self.assertEqual(names, ['молоко'])
+        names = [item['name'] for item in ingredient_index.search('оКо')]
+        self.assertEqual(names, ['молоко', 'сгущенное молоко'])
+
+    def test_index_rebuilt_after_change(self):
+        ingredient_index.search('мол')
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientModel.objects.create(
+                name='молочный шоколад', measurement_unit='г')
+        names = [item['name'] for item in ingredient_index.search('мол')]
+        self.assertEqual(names, ['молоко', 'молочный шоколад'])
+
+
+class RecipeSearchPaginationTests(FoodgramTestCase):
+    """Курсорная пагинация сохраняет порядок релевантности поиска."""
+
+    def test_cursor_follows_search_rank(self):
+        for name, text in (('Суп', 'Пирог к супу'), ('Пирог', 'Пирог'),
+                           ('Салат', 'Пирог'), ('Пирог с пирогом', 'Пирог')):
+            index_recipe(create_recipe(self.user, name, text))
+        client = APIClient()
+        search = quote('пирог')
+        expected = [recipe['id'] for recipe in client.get(
+            f'/api/recipes/?search={search}&limit=10').data['results']]
+        self.assertEqual(len(expected), 4)
+        self.assertNotEqual(expected, sorted(expected, reverse=True))
+
+        found = []
+        url = f'/api/recipes/?search={search}&limit=1&pagination=cursor'
+        while url:
+            data = client.get(url).data
+            found += [recipe['id'] for recipe in data['results']]
+            url = data['next']
+        self.assertEqual(found, expected)
+
+
+class RecipeSearchIndexTests(FoodgramTestCase):
+    """Поисковый документ рецепта следует за названиями продуктов."""
+
+    def test_ingredient_rename_reindexes_recipes(self):
+        ingredient = IngredientModel.objects.create(
+            name='Молоко', measurement_unit='мл')
+        recipes = [create_recipe(self.user, name) for name in ('Суп', 'Каша')]
+        for recipe in recipes:
+            IngredientRecipeModel.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=1)
+            index_recipe(recipe)
+        self.assertEqual(len(search_recipe_ids('молоко')), 2)
+
+        ingredient.name = 'Кефир'
+        # Продукт, дата рецептов, рецепты, их продукты, уже
+        # проиндексированные рецепты и одно обновление документов.
+        with self.assertNumQueries(6):
+            ingredient.save()
+        self.assertEqual(search_recipe_ids('молоко'), [])
+        self.assertEqual(sorted(search_recipe_ids('кефир')),
+                         sorted(recipe.pk for recipe in recipes))
+
+
+class ServerTimingTests(FoodgramTestCase):
+    """Заголовок Server-Timing со временем сериализации."""
+
+    def test_serialization_is_measured(self):
+        create_recipe(self.user)
+        header = APIClient().get('/api/recipes/')['Server-Timing']
+        self.assertEqual(
+            [item.split(';')[0] for item in header.split(', ')],
+            ['db', 'app', 'serialize', 'render', 'total'])
+        serialize = re.search(r'serialize;dur=([\d.]+)', header)
+        self.assertGreater(float(serialize.group(1)), 0)
+
+
+class QueryStatsTests(TestCase):
+    """Статистика запросов занимает ограниченную память."""
+
+    def test_duplicates_are_capped(self):
+        stats = QueryStats(window=10)
+        stats.add('GET recipes', (1, 1, 0, 0, 0, 2), {'SELECT 1': 1000})
+        for index in range(5 * DUPLICATES_KEPT):
+            stats.add('GET recipes', (1, 1, 0, 0, 0, 2),
+                      {f'SELECT {index + 2}': 2})
+            self.assertLessEqual(
+                len(stats.duplicates['GET recipes']), DUPLICATES_KEPT)
+        duplicates = stats.report()['views']['GET recipes'][
+            'duplicate_queries']
+        self.assertEqual(len(duplicates), DUPLICATES_LIMIT)
+        self.assertEqual(duplicates[0], {'sql': 'SELECT 1', 'count': 1000})
+
+
+class ConnectionHealthTests(TransactionTestCase):
+    """Постоянное соединение проверяется только после простоя."""
+
+    def test_checked_after_idle(self):
+        connection.ensure_connection()
+        health = {'CONN_HEALTH_CHECKS': True, 'CONN_HEALTH_CHECK_IDLE': 10}
+        with mock.patch.dict(connection.settings_dict, health), \
+                mock.patch.object(connection, 'is_usable',
+                                  return_value=True) as is_usable:
+            mark_idle_connections()
+            check_connections()
+            is_usable.assert_not_called()
+            connection.idle_since -= 10
+            check_connections()
+            is_usable.assert_called_once()
+
+
+class ReplicaReadTests(FoodgramTestCase):
+    """Чтение с реплики выключается после любого GET-запроса."""
+
+    def test_reset_after_unhandled_error(self):
+        recipe = create_recipe(self.user)
+        self.client.raise_request_exception = False
+        with mock.patch.object(RecipeSet, 'get_etag',
+                               side_effect=RuntimeError), \
+                self.assertLogs('django.request', 'ERROR'):
+            response = self.client.get(f'/api/recipes/{recipe.pk}/')
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(_use_replica.get())
+
+
+class QueryPlanTests(FoodgramTestCase):
+    """Горячие запросы API читают таблицы по индексам (EXPLAIN)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        author = create_user('author')
+        recipe = create_recipe(author)
+        FavoriteModel.objects.create(user=cls.user, recipe=recipe)
+        ShoppingCartModel.objects.create(user=cls.user, recipe=recipe)
+        FollowModel.objects.create(user=cls.user, follower=author)
+
+    def test_hot_queries_use_indexes(self):
+        for name, queryset, tables in hot_queries():
+            with self.subTest(query=name):
+                if name == 'ingredient_name_prefix' and not has_trigrams():
+                    self.skipTest('Нет расширения pg_trgm.')
+                plan, full_scans = explain(queryset)
+                self.assertFalse(full_scans & set(tables), plan)
+
+
+class RecipeFilterPlanTests(FoodgramTestCase):
+    """Фильтры рецептов собираются в один запрос без DISTINCT."""
+
+    def test_filters_use_indexes(self):
+        params = {'tags': ['breakfast', 'lunch'], 'is_favorited': '1',
+                  'is_in_shopping_cart': '1'}
+        for mode in ('any', 'all'):
+            request = Request(APIRequestFactory().get(
+                '/api/recipes/', {**params, 'tags_mode': mode}))
+            request.user = self.user
+            queryset = RecipeFilter().filter_queryset(
+                request, RecipeModel.objects.all(), None)
+            with self.subTest(tags_mode=mode):
+                sql = str(queryset.query)
+                self.assertNotIn('DISTINCT', sql)
+                self.assertNotIn('JOIN', sql)
+                with self.assertNumQueries(1):
+                    list(queryset)
+                plan, full_scans = explain(queryset)
+                self.assertFalse(full_scans & {
+                    'Recipe-Tag', 'Favorite', 'ShoppingCart'}, plan)
+
+
+def has_trigrams():
+    """Индекс по названию ингредиента есть (в PostgreSQL нужен pg_trgm)."""
+    if connection.vendor != 'postgresql':
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+
+class ExportImportTests(TestCase):
+    """Выгрузка export загружается обратно через import_db."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Ингредиент по умолчанию не выгружается, import_db создает его.
+        IngredientModel.objects.create(
+            name='Какой-то ингредиент', measurement_unit='Что-то')
+        user, author = create_user(), create_user('author')
+        tags = [TagModel.objects.create(
+            name=f'Тег {index}', color=f'#00000{index}', slug=f'tag-{index}')
+            for index in range(2)]
+        ingredients = [IngredientModel.objects.create(
+            name=f'Ингредиент {index}', measurement_unit='г')
+            for index in range(3)]
+        IngredientModel.objects.create(
+            name='Без рецепта', measurement_unit='г')
+        for index in range(2):
+            recipe = create_recipe(author, f'Рецепт {index}')
+            TagRecipeModel.objects.create(tag=tags[index], recipe=recipe)
+            for amount, ingredient in enumerate(ingredients[index:], 1):
+                IngredientRecipeModel.objects.create(
+                    ingredient=ingredient, recipe=recipe, amount=amount)
+            FavoriteModel.objects.create(user=user, recipe=recipe)
+        ShoppingCartModel.objects.create(user=author, recipe=recipe)
+        FollowModel.objects.create(user=user, follower=author)
+
+    def snapshot(self):
+        """Данные по естественным ключам, без id."""
+        def rows(queryset, *fields):
+            return set(queryset.values_list(*fields))
+        relation = ('user__email', 'recipe__author__email', 'recipe__name')
+        return {
+            'ingredients': rows(IngredientModel.objects.exclude(
+                name='Какой-то ингредиент'), 'name', 'measurement_unit'),
+            'tags': rows(TagModel.objects, 'name', 'color', 'slug'),
+            'users': rows(User.objects, 'email', 'username', 'password',
+                          'recipes_count', 'subscribers_count'),
+            'recipes': rows(RecipeModel.objects, 'author__email', 'name',
+                            'text', 'cooking_time', 'favorites_count',
+                            'shopping_count'),
+            'recipe_tags': rows(TagRecipeModel.objects, 'recipe__name',
+                                'tag_id'),
+            'recipe_ingredients': rows(
+                IngredientRecipeModel.objects, 'recipe__name',
+                'ingredient__name', 'ingredient__measurement_unit', 'amount'),
+            'favorites': rows(FavoriteModel.objects, *relation),
+            'shopping_cart': rows(ShoppingCartModel.objects, *relation),
+            'follows': rows(FollowModel.objects, 'user__email',
+                            'follower__email'),
+        }
+
+    def import_all(self, directory):
+        for name in dict_model:
+            call_command('import_db', model=name,
+                         read=f'{directory}/{name}.ndjson.gz',
+                         stdout=io.StringIO())
+
+    def test_round_trip(self):
+        expected = self.snapshot()
+        with tempfile.TemporaryDirectory(dir=main_dir) as directory:
+            directory = os.path.relpath(directory, main_dir)
+            call_command('export', output=directory, gzip=True,
+                         stdout=io.StringIO())
+            User.objects.all().delete()
+            TagModel.objects.all().delete()
+            IngredientModel.objects.all().delete()
+
+            self.import_all(directory)
+            self.assertEqual(self.snapshot(), expected)
+            # Повторная загрузка ничего не дублирует.
+            self.import_all(directory)
+            self.assertEqual(self.snapshot(), expected)
@@ -1,9 +1,11 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (FavoriteView, GetFollowSet, GetShoppingCartSet,
+from .views import (BulkFavoriteView, BulkFollowView, BulkShoppingCartView,
+                    FavoriteView, GetFollowSet, GetShoppingCartSet,
                     IngredientSet, PostDelFollowView, PostDelShoppingCartView,
-                    RecipeSet, TagSet)
+                    QueryStatsView, RecipeSet, TagSet)
 
 router = DefaultRouter()
 router.register("tags", TagSet, basename="tags")
@@ -14,7 +16,36 @@ router.register("recipes", RecipeSet, basename="recipes")
 router.register("users/subscriptions", GetFollowSet, basename="get_follow")
 
 
+# Массовые операции стоят раньше router, иначе recipes/favorite/
+# совпадет с адресом рецепта.
 urlpatterns = [
+    path("recipes/favorite/", BulkFavoriteView.as_view(),
+         name='bulk_favorite'),
+    path("recipes/shopping_cart/", BulkShoppingCartView.as_view(),
+         name='bulk_shopping_cart'),
+    path("users/subscribe/", BulkFollowView.as_view(), name='bulk_follow'),
+]
+
+if settings.ASYNC_READ_VIEWS:
+    from . import async_views
+
+    # Асинхронные версии эндпоинтов для ASGI, под теми же именами,
+    # что и у маршрутов router, и раньше них.
+    urlpatterns += [
+        path("tags/", async_views.tag_list, name="tags-list"),
+        path("tags/<int:pk>/", async_views.tag_detail, name="tags-detail"),
+        path("ingredients/", async_views.ingredient_list,
+             name="ingredients-list"),
+        path("ingredients/<int:pk>/", async_views.ingredient_detail,
+             name="ingredients-detail"),
+        path("recipes/", async_views.recipe_list, name="recipes-list"),
+        path("recipes/<int:pk>/", async_views.recipe_detail,
+             name="recipes-detail"),
+        path("users/subscriptions/", async_views.subscriptions,
+             name="get_follow-list"),
+    ]
+
+urlpatterns += [
     path("", include(router.urls)),
     path("recipes/<int:favorite_id>/favorite/",
          FavoriteView.as_view(), name='post_del_favorite'),
@@ -22,4 +53,5 @@ urlpatterns = [
          PostDelFollowView.as_view(), name='post_del_follow'),
     path("recipes/<int:shopping_cart_id>/shopping_cart/",
          PostDelShoppingCartView.as_view(), name='post_del_shopping_cart'),
+    path("stats/queries/", QueryStatsView.as_view(), name='query_stats'),
 ]
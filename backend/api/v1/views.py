@@ -1,22 +1,39 @@
+import hashlib
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.http import HttpResponse
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import Exists, F, OuterRef, Prefetch, Sum
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
 from rest_framework import filters, permissions, status, viewsets
 from rest_framework.response import Response
 from rest_framework.permissions import (IsAuthenticatedOrReadOnly,
                                         IsAuthenticated)
 from rest_framework.views import APIView
 
+from core.db import read_from_primary
+from core.exception import BadRequest
+from core.middleware import query_stats
 from profile_user.models import FavoriteModel, FollowModel, ShoppingCartModel
+from profile_user.relations import favorites, follows, shopping_cart
 from recipe.models import (IngredientModel, IngredientRecipeModel, RecipeModel,
                            TagModel)
-from .filterset import (FavoriteRecipeFilter, IngredientFilter,
-                        TagsRecipeFilter, ShoppingRecipeFilter)
-from .pagination import CustomPagination
+from .autocomplete import ingredient_index
+from .cache import (INGREDIENTS, TAGS, apply_user_flags,
+                    get_cached_recipe_list, recipe_list_cache_key,
+                    set_cached_recipe_list)
+from .catalog import catalog_response
+from .filterset import IngredientFilter, RecipeFilter, RecipeSearchFilter
+from .pagination import CustomPagination, LimitOffsetCursorPagination
+from .renderers import (ShoppingCartCSVRenderer, ShoppingCartJSONRenderer,
+                        ShoppingCartPDFRenderer, ShoppingCartTextRenderer)
 from .serializers import (FavoriteSerializer, FollowSerializer,
                           IngredientSerializer, RecipeSerializer,
                           ShoppingCartSerializer, TagSerializer)
-from .viewset import GetViewSet
+from .viewset import GetViewSet, ReplicaReadMixin, TimedSerializationMixin
 
 User = get_user_model()
 
@@ -31,6 +48,16 @@ class TagSet(GetViewSet):
     search_fields = ("name", "slug")
     pagination_class = CustomPagination
 
+    def list(self, request, *args, **kwargs):
+        return catalog_response(
+            request, TAGS, lambda: super(TagSet, self).list(
+                request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return catalog_response(
+            request, TAGS, lambda: super(TagSet, self).retrieve(
+                request, *args, **kwargs))
+
 
 class IngredientSet(GetViewSet):
     """ViewSet модели ингредиентов."""
@@ -41,20 +68,132 @@ class IngredientSet(GetViewSet):
     filter_backends = (IngredientFilter,)
     pagination_class = CustomPagination
 
-
-class RecipeSet(viewsets.ModelViewSet):
+    def list(self, request, *args, **kwargs):
+        return catalog_response(
+            request, INGREDIENTS, lambda: self.search_list(
+                request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return catalog_response(
+            request, INGREDIENTS, lambda: super(IngredientSet, self).retrieve(
+                request, *args, **kwargs))
+
+    def search_list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        page = self.paginate_queryset(ingredient_index.search(name))
+        return self.get_paginated_response(page)
+
+
+def annotate_user_flags(queryset, user):
+    """Флаги избранного, корзины и подписки на автора для рецептов."""
+    if isinstance(user, AnonymousUser):
+        return queryset
+    return queryset.annotate(
+        is_favorited=Exists(FavoriteModel.objects.filter(
+            recipe=OuterRef('pk'), user=user)),
+        is_in_shopping_cart=Exists(ShoppingCartModel.objects.filter(
+            recipe=OuterRef('pk'), user=user)),
+        author_is_subscribed=Exists(FollowModel.objects.filter(
+            follower=OuterRef('author'), user=user)),
+    )
+
+
+class RecipeSet(ReplicaReadMixin, TimedSerializationMixin,
+                viewsets.ModelViewSet):
     """ViewSet модели рецептов пользователей."""
     queryset = RecipeModel.objects.all()
     serializer_class = RecipeSerializer
     permission_classes = (IsAuthenticatedOrReadOnly, )
-    filter_backends = (filters.SearchFilter,
-                       TagsRecipeFilter,
-                       FavoriteRecipeFilter,
-                       ShoppingRecipeFilter)
-    search_fields = ("text",)
+    filter_backends = (RecipeSearchFilter, RecipeFilter)
+    pagination_class = LimitOffsetCursorPagination
+
+    def get_queryset(self):
+        return annotate_user_flags(
+            RecipeModel.objects.with_related(), self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        cache_key = recipe_list_cache_key(request)
+        if cache_key is None:
+            return super().list(request, *args, **kwargs)
+        data = get_cached_recipe_list(cache_key)
+        if data is None:
+            # Кэш живет дольше отставания реплики.
+            with read_from_primary():
+                data = self.get_shared_list_data()
+            set_cached_recipe_list(cache_key, data)
+        recipes = data['results'] if isinstance(data, dict) else data
+        apply_user_flags(recipes, request.user)
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = self.get_etag()
+        if etag is not None:
+            response = get_conditional_response(request, etag=etag)
+            if response is not None:
+                return self.patch_conditional_headers(response, etag)
+        response = super().retrieve(request, *args, **kwargs)
+        if etag is not None and response.status_code == 200:
+            self.patch_conditional_headers(response, etag)
+        return response
+
+    def get_etag(self):
+        """
+        ETag рецепта без загрузки и сериализации объекта.
+
+        Складывается из даты изменения рецепта и флагов текущего
+        пользователя, поэтому смена флага меняет ETag только у него.
+        Дата сдвигается и при изменении тегов, продуктов и автора
+        рецепта (recipe.signals).
+        """
+        flags = ('is_favorited', 'is_in_shopping_cart',
+                 'author_is_subscribed')
+        if isinstance(self.request.user, AnonymousUser):
+            flags = ()
+        try:
+            row = self.get_queryset().filter(
+                pk=self.kwargs[self.lookup_field]).values(
+                'updated_at', 'author_id', *flags).first()
+        except (TypeError, ValueError):
+            row = None
+        if row is None:
+            return None
+        value = ":".join(str(row[key]) for key in sorted(row))
+        value += f":{self.request.accepted_renderer.format}"
+        return '"%s"' % hashlib.md5(value.encode()).hexdigest()
+
+    def patch_conditional_headers(self, response, etag):
+        response['ETag'] = etag
+        # Ответ зависит от пользователя, поэтому кэшируется только
+        # в браузере и каждый раз проверяется запросом с If-None-Match.
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Accept', 'Authorization', 'Cookie'))
+        return response
+
+    def get_shared_list_data(self):
+        """Список рецептов без флагов пользователя, общий для всех."""
+        queryset = self.filter_queryset(RecipeModel.objects.with_related())
+        context = {**self.get_serializer_context(), 'user_flags': False}
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return self.get_serializer(
+                queryset, many=True, context=context).data
+        serializer = self.get_serializer(page, many=True, context=context)
+        return self.get_paginated_response(serializer.data).data
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
+        self.reload_instance(serializer)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        self.reload_instance(serializer)
+
+    def reload_instance(self, serializer):
+        """Перечитывает рецепт со связями одним набором запросов."""
+        serializer.instance = self.get_queryset().get(
+            pk=serializer.instance.pk)
 
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -67,16 +206,35 @@ class RecipeSet(viewsets.ModelViewSet):
         return super().update(request, *args, **kwargs)
 
 
+def get_recipes_limit(request):
+    """Значение параметра recipes_limit или None, если он не задан."""
+    recipes_limit = request.query_params.get('recipes_limit')
+    if not recipes_limit:
+        return None
+    if not recipes_limit.isdigit() or int(recipes_limit) < 1:
+        raise BadRequest(
+            {"errors": "recipes_limit должен быть целым числом больше 0."})
+    return int(recipes_limit)
+
+
 class GetFollowSet(GetViewSet):
     """ViewSet модели подписок пользователей, только Get-запросы."""
 
     queryset = FollowModel.objects.all()
     serializer_class = FollowSerializer
     permission_classes = (IsAuthenticated, )
+    pagination_class = LimitOffsetCursorPagination
 
     def get_queryset(self):
         user = self.request.user
-        queryset = FollowModel.objects.filter(user=user)
+        recipes = RecipeModel.objects.all()
+        recipes_limit = get_recipes_limit(self.request)
+        if recipes_limit:
+            recipes = recipes.latest_per_author(recipes_limit)
+        queryset = FollowModel.objects.filter(
+            user=user).select_related('follower').prefetch_related(
+            Prefetch('follower__recipes', queryset=recipes,
+                     to_attr='limited_recipes'))
         return queryset
 
 
@@ -88,28 +246,25 @@ class PostDelFollowView(APIView):
         user = request.user
         author_id = kwargs.get("follow_id")
         if user.id == author_id:
-            Response({"errors": "Подписаться на самого себя нельзя!"},
-                     status=status.HTTP_400_BAD_REQUEST)
+            return Response({"errors": "Подписаться на самого себя нельзя!"},
+                            status=status.HTTP_400_BAD_REQUEST)
 
         author = get_object_or_404(User, id=author_id)
-        follow, flag_created = FollowModel.objects.get_or_create(
-            user=user, follower=author
-        )
-        if not flag_created:
+        if not follows.add(user, [author.pk]):
             return Response({"errors": "Связь уже существует!"},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = FollowSerializer(follow, context={"request": request})
+        serializer = FollowSerializer(
+            FollowModel(user=user, follower=author), context={
+                "request": request,
+                "recipes_limit": get_recipes_limit(request),
+            })
         return Response(serializer.data,
                         status=status.HTTP_201_CREATED)
 
     def delete(self, request, *args, **kwargs):
-        follow_id = kwargs.get("follow_id")
-        author = get_object_or_404(User, id=follow_id)
-        user = request.user
-        follow_model = get_object_or_404(FollowModel,
-                                         follower=author, user=user)
-        follow_model.delete()
+        if not follows.remove(request.user, [kwargs.get("follow_id")]):
+            raise Http404
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -117,42 +272,42 @@ class GetShoppingCartSet(GetViewSet):
     """ViewSet модели покупок пользователя, только Get-запросы."""
     queryset = ShoppingCartModel.objects.all()
     permission_classes = (IsAuthenticated, )
+    renderer_classes = (ShoppingCartTextRenderer,
+                        ShoppingCartCSVRenderer,
+                        ShoppingCartJSONRenderer,
+                        ShoppingCartPDFRenderer)
 
     def get_queryset(self):
         user = self.request.user
         return ShoppingCartModel.objects.filter(user=user)
 
+    def get_renderers(self):
+        return [renderer for renderer in super().get_renderers()
+                if getattr(renderer, 'is_available', lambda: True)()]
+
     def list(self, request, *args, **kwargs):
         queryset_shop = self.get_queryset()
-        ingredient_data = self.get_ingredient_data(queryset_shop)
-        content = ""
-        for key, value in ingredient_data.items():
-            string_row = f"{key} — {value} \n"
-            content += string_row
-        response = HttpResponse(content, content_type="text/plain")
-        response['Content-Disposition'] = 'attachment; filename=file.txt'
+        ingredient_data = self.get_ingredient_data(queryset_shop).iterator()
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f"{content_type}; charset={renderer.charset}"
+        response = StreamingHttpResponse(renderer.stream(ingredient_data),
+                                         content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename={renderer.get_filename()}')
         return response
 
-    def get_ingredient_data(self, queryset_shop) -> dict:
-        ingredient_data = {}
-
-        for shop_model in enumerate(queryset_shop):
-            recipe_model = shop_model[1].recipe
-            queryset_ingredient = IngredientRecipeModel.objects.filter(
-                recipe=recipe_model)
-
-            for ingredient_model in enumerate(queryset_ingredient):
-                name = ingredient_model[1].ingredient.name
-                measurement_unit = (
-                    ingredient_model[1].ingredient.measurement_unit)
-                amount = ingredient_model[1].amount
-                key = f"{name} ({measurement_unit})"
-                if ingredient_data.get(key) is None:
-                    ingredient_data[key] = amount
-                else:
-                    ingredient_data[key] += amount
-
-        return ingredient_data
+    def get_ingredient_data(self, queryset_shop):
+        """Суммирует ингредиенты корзины одним групповым запросом."""
+        return (
+            IngredientRecipeModel.objects
+            .filter(recipe__shopping__in=queryset_shop)
+            .values(name=F('ingredient__name'),
+                    measurement_unit=F('ingredient__measurement_unit'))
+            .annotate(amount=Sum('amount'))
+            .order_by('name', 'measurement_unit')
+        )
 
 
 class PostDelShoppingCartView(APIView):
@@ -162,26 +317,23 @@ class PostDelShoppingCartView(APIView):
     def post(self, request, *args, **kwargs):
         user = request.user
         recipe_id = kwargs.get("shopping_cart_id")
-        recipe = get_object_or_404(RecipeModel, id=recipe_id)
-        shopping_cart, flag_created = ShoppingCartModel.objects.get_or_create(
-            user=user, recipe=recipe
-        )
-        if not flag_created:
+        recipe = get_object_or_404(
+            RecipeModel.objects.only('id', 'name', 'image', 'cooking_time'),
+            id=recipe_id)
+        if not shopping_cart.add(user, [recipe.pk]):
             return Response({"errors": "Связь уже существует!"},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = ShoppingCartSerializer(shopping_cart,
-                                            context={"request": request})
+        serializer = ShoppingCartSerializer(
+            ShoppingCartModel(user=user, recipe=recipe),
+            context={"request": request})
         return Response(serializer.data,
                         status=status.HTTP_201_CREATED)
 
     def delete(self, request, *args, **kwargs):
         recipe_id = kwargs.get("shopping_cart_id")
-        recipe = get_object_or_404(RecipeModel, id=recipe_id)
-        user = request.user
-        favorite_model = get_object_or_404(ShoppingCartModel,
-                                           recipe=recipe, user=user)
-        favorite_model.delete()
+        if not shopping_cart.remove(request.user, [recipe_id]):
+            raise Http404
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -195,23 +347,86 @@ class FavoriteView(APIView):
     def post(self, request, *args, **kwargs):
         user = request.user
         recipe_id = kwargs.get("favorite_id")
-        recipe = get_object_or_404(RecipeModel, id=recipe_id)
-        favorite, flag_created = FavoriteModel.objects.get_or_create(
-            user=user, recipe=recipe
-        )
-        if not flag_created:
+        recipe = get_object_or_404(
+            annotate_user_flags(RecipeModel.objects.with_related(), user),
+            id=recipe_id)
+        if not favorites.add(user, [recipe.pk]):
             return Response({"errors": "Связь уже существует!"},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        serializer = FavoriteSerializer(favorite, context={"request": request})
+        recipe.is_favorited = True
+        serializer = FavoriteSerializer(
+            FavoriteModel(user=user, recipe=recipe),
+            context={"request": request})
         return Response(serializer.data,
                         status=status.HTTP_201_CREATED)
 
     def delete(self, request, *args, **kwargs):
         recipe_id = kwargs.get("favorite_id")
-        recipe = get_object_or_404(RecipeModel, id=recipe_id)
-        user = request.user
-        favorite = get_object_or_404(FavoriteModel,
-                                     recipe=recipe, user=user)
-        favorite.delete()
+        if not favorites.remove(request.user, [recipe_id]):
+            raise Http404
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class BulkRelationView(APIView):
+    """
+    Массовое добавление (Post) и удаление (Del) связей пользователя.
+
+    Тело запроса — {field: [id, ...]}. В ответе перечислены id,
+    связь с которыми изменилась, и пропущенные id: уже связанные
+    или несуществующие при добавлении, не связанные при удалении.
+    """
+    permission_classes = (IsAuthenticated, )
+    relation = None
+    field = "recipes"
+
+    def get_ids(self, request):
+        ids = request.data.get(self.field)
+        if (not isinstance(ids, list) or not ids
+                or len(ids) > settings.RELATIONS_BULK_LIMIT
+                or not all(isinstance(pk, int) and not isinstance(pk, bool)
+                           and pk > 0 for pk in ids)):
+            raise BadRequest({"errors": (
+                f"{self.field} должен быть непустым списком id, "
+                f"не более {settings.RELATIONS_BULK_LIMIT}.")})
+        return set(ids)
+
+    def post(self, request, *args, **kwargs):
+        ids = self.get_ids(request)
+        added = self.relation.add(request.user, ids)
+        return Response({"added": added,
+                         "skipped": sorted(ids.difference(added))})
+
+    def delete(self, request, *args, **kwargs):
+        ids = self.get_ids(request)
+        removed = self.relation.remove(request.user, ids)
+        return Response({"removed": removed,
+                         "skipped": sorted(ids.difference(removed))})
+
+
+class BulkFavoriteView(BulkRelationView):
+    """Массовое добавление рецептов в избранное и удаление из него."""
+    relation = favorites
+
+
+class BulkShoppingCartView(BulkRelationView):
+    """Массовое добавление рецептов в корзину и удаление из нее."""
+    relation = shopping_cart
+
+
+class BulkFollowView(BulkRelationView):
+    """Массовая подписка на авторов и отписка от них."""
+    relation = follows
+    field = "users"
+
+
+class QueryStatsView(APIView):
+    """Статистика SQL-запросов и времени ответа по эндпоинтам."""
+    permission_classes = (permissions.IsAdminUser, )
+
+    def get(self, request):
+        return Response(query_stats.report())
+
+    def delete(self, request):
+        query_stats.reset()
         return Response(status=status.HTTP_204_NO_CONTENT)
@@ -1,8 +1,45 @@
+from contextlib import ExitStack
+
 from rest_framework import mixins
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.viewsets import GenericViewSet
 
+from core.db import read_from_replica
+from core.middleware import timed_serialization
+
+
+class ReplicaReadMixin:
+    """
+    Чтение с реплики для GET-запросов.
+
+    Включается после аутентификации, чтобы только что выданный токен
+    искался в основной базе, и выключается в dispatch даже при
+    исключении, которое DRF не обрабатывает.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with ExitStack() as self._replica:
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS:
+            self._replica.enter_context(read_from_replica())
+
+
+class TimedSerializationMixin:
+    """Замер времени сериализации ответа для статистики запросов."""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        serializer.to_representation = timed_serialization(
+            serializer.to_representation)
+        return serializer
+
 
 class GetViewSet(
+    ReplicaReadMixin,
+    TimedSerializationMixin,
     mixins.RetrieveModelMixin,
     mixins.ListModelMixin,
     GenericViewSet,
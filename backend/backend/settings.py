@@ -36,6 +36,7 @@ AUTH_USER_MODEL = 'user.UserModel'
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.QueryStatsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -64,23 +65,117 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
-DATABASES = {
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite3')
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'django'),
+            'USER': os.getenv('POSTGRES_USER', 'django'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', ''),
+            'PORT': os.getenv('DB_PORT', 5432),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': os.getenv(
+                'DB_CONN_HEALTH_CHECKS', 'True') == 'True',
+            # Проверять соединение, простоявшее столько секунд.
+            'CONN_HEALTH_CHECK_IDLE': int(
+                os.getenv('DB_CONN_HEALTH_CHECK_IDLE', 10)),
+            # PgBouncer в режиме transaction не держит серверные курсоры
+            # между транзакциями.
+            'DISABLE_SERVER_SIDE_CURSORS': os.getenv(
+                'DB_POOL_MODE', '') == 'transaction',
+            'OPTIONS': {
+                'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+            },
+        }
+    }
+    if os.getenv('DB_REPLICA_HOST'):
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'HOST': os.getenv('DB_REPLICA_HOST'),
+            'PORT': os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+            'TEST': {'MIRROR': 'default'},
+        }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'OPTIONS': {
+                # Сколько секунд ждать снятия блокировки другой записью.
+                'timeout': float(os.getenv('SQLITE_BUSY_TIMEOUT', 20)),
+            },
+        }
+    }
+
+# PRAGMA для каждого нового соединения SQLite, пустое значение пропускает
+# PRAGMA. В режиме WAL чтение не ждет записи, рядом с базой появляются
+# файлы -wal и -shm, поэтому в контейнер монтируется каталог базы.
+SQLITE_PRAGMAS = {
+    'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+    'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+    'mmap_size': os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)),
+    # Отрицательное значение — размер в КБ.
+    'cache_size': os.getenv('SQLITE_CACHE_SIZE', '-65536'),
+    'temp_store': os.getenv('SQLITE_TEMP_STORE', 'MEMORY'),
+}
+
+DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+
+# Версии данных и кэш списков рецептов должны быть общими для всех
+# воркеров gunicorn: с LocMemCache каждый процесс видит только свои
+# изменения. В docker-compose используется memcached.
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
     }
 }
 
-# DATABASES = {
-#     'default': {
-#         'ENGINE': 'django.db.backends.postgresql',
-#         'NAME': os.getenv('POSTGRES_DB', 'django'),
-#         'USER': os.getenv('POSTGRES_USER', 'django'),
-#         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
-#         'HOST': os.getenv('DB_HOST', ''),
-#         'PORT': os.getenv('DB_PORT', 5432)
-#     }
-# }
+RECIPE_LIST_CACHE_TIMEOUT = int(os.getenv('RECIPE_LIST_CACHE_TIMEOUT', 300))
+
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 600))
+
+# Срок жизни версий данных и готовых ответов справочников. Нужен
+# только LocMemCache: изменения из других процессов становятся видны
+# не позже чем через это время. В общем кэше версии не истекают,
+# иначе ETag и Last-Modified справочников менялись бы без изменений.
+CACHE_VERSION_TIMEOUT = None
+if CACHES['default']['BACKEND'].endswith('.LocMemCache'):
+    CACHE_VERSION_TIMEOUT = min(
+        int(os.getenv('CACHE_VERSION_TIMEOUT', 300)), INGREDIENT_INDEX_TTL)
+
+CATALOG_CACHE_MAX_AGE = int(os.getenv('CATALOG_CACHE_MAX_AGE', 300))
+CATALOG_CACHE_ENTRIES = 256
+
+RECIPE_SEARCH_LIMIT = int(os.getenv('RECIPE_SEARCH_LIMIT', 200))
+
+# Шрифт, встраиваемый в PDF списка покупок (без него PDF недоступен).
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
+RELATIONS_BULK_LIMIT = int(os.getenv('RELATIONS_BULK_LIMIT', 100))
+
+RECIPE_IMAGE_RENDITIONS = {'card': 320, 'detail': 800, 'retina': 1600}
+RECIPE_IMAGE_FORMATS = ('webp', 'jpeg')
+RECIPE_IMAGE_QUALITY = int(os.getenv('RECIPE_IMAGE_QUALITY', 80))
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', 2))
+RECIPE_IMAGE_MAX_SIZE = int(os.getenv('RECIPE_IMAGE_MAX_SIZE', 10 * 2 ** 20))
+RECIPE_IMAGE_MAX_PIXELS = int(os.getenv('RECIPE_IMAGE_MAX_PIXELS', 40_000_000))
+
+QUERY_STATS_ENABLED = os.getenv('QUERY_STATS_ENABLED', 'True') == 'True'
+QUERY_STATS_SERVER_TIMING = os.getenv(
+    'QUERY_STATS_SERVER_TIMING', 'True') == 'True'
+QUERY_STATS_WINDOW = int(os.getenv('QUERY_STATS_WINDOW', 1000))
+
+# Асинхронные view для чтения, включаются при запуске под ASGI.
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'False') == 'True'
+
+# Тело JSON-запроса должно вмещать фото в base64 (+1/3 к размеру).
+DATA_UPLOAD_MAX_MEMORY_SIZE = RECIPE_IMAGE_MAX_SIZE * 4 // 3 + 2 ** 20
 
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -0,0 +1,111 @@
+"""
+Работа с несколькими базами и постоянными соединениями.
+
+ReplicaRouter отправляет чтение на реплику (база replica), пока
+в текущем контексте включен read_from_replica, — это делают
+GET-запросы viewset'ов API. Все остальное, включая аутентификацию
+и запись, идет в default. Данные, которые кладутся в кэш под новую
+версию, читаются внутри read_from_primary, чтобы отставание реплики
+не закэшировалось.
+
+check_connections повторяет CONN_HEALTH_CHECKS из Django 4.1:
+перед запросом постоянное соединение проверяется и закрывается,
+если база его уже разорвала. Проверяются только соединения,
+простоявшие без запросов не меньше CONN_HEALTH_CHECK_IDLE секунд:
+занятый воркер не тратит лишний SELECT 1 на каждый запрос.
+
+configure_sqlite выполняет SQLITE_PRAGMAS из настроек для каждого
+нового соединения SQLite.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+REPLICA = 'replica'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+@contextmanager
+def read_from_replica():
+    """Чтение внутри блока идет на реплику, если она настроена."""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+@contextmanager
+def read_from_primary():
+    """Чтение внутри блока идет в основную базу."""
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    """Чтение с реплики внутри read_from_replica, остальное — в default."""
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and REPLICA in settings.DATABASES:
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На реплике те же данные, что и в default.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
+
+
+def check_connections(**kwargs):
+    """Закрывает разорванные постоянные соединения после простоя."""
+    now = time.monotonic()
+    for connection in connections.all():
+        idle_since = getattr(connection, 'idle_since', None)
+        if (connection.connection is not None
+                and connection.settings_dict.get('CONN_HEALTH_CHECKS')
+                and idle_since is not None
+                and now - idle_since >= connection.settings_dict.get(
+                    'CONN_HEALTH_CHECK_IDLE', 0)
+                and not connection.in_atomic_block
+                and not connection.is_usable()):
+            connection.close()
+
+
+def mark_idle_connections(**kwargs):
+    """Запоминает, с какого момента открытые соединения простаивают."""
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is not None:
+            connection.idle_since = now
+
+
+request_started.connect(check_connections, dispatch_uid='core.db.health')
+request_finished.connect(mark_idle_connections, dispatch_uid='core.db.idle')
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """Выполняет SQLITE_PRAGMAS на новом соединении SQLite."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            if value not in (None, ''):
+                cursor.execute(f'PRAGMA {name} = {value}')
+
+
+connection_created.connect(configure_sqlite, dispatch_uid='core.db.sqlite')
@@ -0,0 +1,362 @@
+"""
+Общие функции команд импорта и экспорта.
+
+Файлы читаются построчно (CSV, NDJSON) или по одному объекту
+(JSON-массив), строки записываются и выгружаются пачками, поэтому
+расход памяти зависит только от размера пачки.
+
+Связи между объектами задаются естественными ключами: пользователь —
+email, тег — slug, ингредиент — (name, measurement_unit),
+рецепт — (email автора, name). Поэтому выгрузку можно загрузить
+в другую базу, где id объектов не совпадают.
+"""
+import csv
+import gzip
+import json
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from profile_user.models import FavoriteModel, FollowModel, ShoppingCartModel
+from recipe.models import (IngredientModel, IngredientRecipeModel, RecipeModel,
+                           RecipeSearchModel, TagModel, TagRecipeModel)
+from recipe.search import build_document
+
+User = get_user_model()
+
+READ_SIZE = 64 * 1024
+
+
+def count_subquery(model, field):
+    """Подзапрос количества строк model, ссылающихся на текущий объект."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(count=Count('id')).values('count')
+    ), 0)
+
+
+def _iter_json_array(file):
+    """Объекты JSON-массива по одному, без чтения файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('Ожидается JSON-массив.')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise
+            buffer += chunk
+            continue
+        yield obj
+        buffer = buffer[end:]
+        if len(buffer) < READ_SIZE:
+            buffer += file.read(READ_SIZE)
+
+
+def open_file(path, mode='rt'):
+    """Открывает файл, при расширении .gz — через gzip."""
+    if path.suffix == '.gz':
+        return gzip.open(path, mode, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def read_rows(file, file_format):
+    """Строки файла в виде словарей."""
+    if file_format == 'csv':
+        yield from csv.DictReader(file, delimiter=",")
+    elif file_format == 'json':
+        yield from _iter_json_array(file)
+    else:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def batched(rows, size):
+    """Разбивает поток строк на списки не длиннее size."""
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def import_ingredients(rows):
+    """
+    Ингредиенты. Ключ — пара (name, measurement_unit).
+
+    Других полей у ингредиента нет, поэтому уже существующие
+    строки просто пропускаются.
+    """
+    IngredientModel.objects.bulk_create(
+        (IngredientModel(name=row['name'],
+                         measurement_unit=row['measurement_unit'])
+         for row in rows),
+        ignore_conflicts=True,
+    )
+
+
+def import_tags(rows):
+    """Теги. Ключ — slug, у существующих обновляются name и color."""
+    existing = TagModel.objects.in_bulk(
+        [row['slug'] for row in rows], field_name='slug')
+    to_create, to_update = [], []
+    for row in rows:
+        tag = existing.get(row['slug'])
+        if tag is None:
+            to_create.append(TagModel(
+                name=row['name'], color=row['color'], slug=row['slug']))
+        elif (tag.name, tag.color) != (row['name'], row['color']):
+            tag.name, tag.color = row['name'], row['color']
+            to_update.append(tag)
+    TagModel.objects.bulk_create(to_create, ignore_conflicts=True)
+    TagModel.objects.bulk_update(to_update, ['name', 'color'])
+
+
+def import_users(rows):
+    """
+    Пользователи. Ключ — email, существующие пропускаются.
+
+    password — хеш пароля в формате Django, raw_password — пароль
+    в открытом виде. Без них пароль остается неиспользуемым.
+    """
+    users = []
+    for row in rows:
+        password = row.get('password')
+        if not password:
+            password = make_password(row.get('raw_password') or None)
+        users.append(User(
+            email=row['email'],
+            username=row['username'],
+            first_name=row.get('first_name', ''),
+            last_name=row.get('last_name', ''),
+            password=password,
+        ))
+    User.objects.bulk_create(users, ignore_conflicts=True)
+
+
+def import_recipes(rows):
+    """
+    Рецепты с тегами и ингредиентами.
+
+    Автор задается email, теги — списком slug, ингредиенты — списком
+    объектов с name, measurement_unit и amount. Ключ — пара
+    (author, name), существующие рецепты пропускаются.
+    """
+    authors = User.objects.in_bulk(
+        {row['author'] for row in rows}, field_name='email')
+    ingredient_keys = {
+        (line['name'], line['measurement_unit'])
+        for row in rows for line in row.get('ingredients', ())}
+    ingredients = {
+        (ingredient.name, ingredient.measurement_unit): ingredient
+        for ingredient in IngredientModel.objects.filter(
+            name__in={name for name, _ in ingredient_keys})
+        if (ingredient.name, ingredient.measurement_unit) in ingredient_keys
+    }
+    missing = ingredient_keys - ingredients.keys()
+    if missing:
+        IngredientModel.objects.bulk_create(
+            (IngredientModel(name=name, measurement_unit=unit)
+             for name, unit in missing), ignore_conflicts=True)
+        for ingredient in IngredientModel.objects.filter(
+                name__in={name for name, _ in missing}):
+            key = (ingredient.name, ingredient.measurement_unit)
+            if key in missing:
+                ingredients[key] = ingredient
+
+    existing = set(RecipeModel.objects.filter(
+        author__in=authors.values(), name__in={row['name'] for row in rows}
+    ).values_list('author_id', 'name'))
+    new_rows = {}
+    for row in rows:
+        author = authors.get(row['author'])
+        if author is None:
+            raise ValueError(f"Пользователь {row['author']} не найден.")
+        key = (author.id, row['name'])
+        if key not in existing:
+            new_rows[key] = row
+    RecipeModel.objects.bulk_create(
+        RecipeModel(author_id=author_id, name=name, text=row['text'],
+                    cooking_time=row['cooking_time'],
+                    image=row.get('image', ''))
+        for (author_id, name), row in new_rows.items())
+
+    # bulk_create возвращает id не на всех СУБД, поэтому id
+    # созданных рецептов читаются отдельным запросом.
+    tag_lines, ingredient_lines, documents = [], [], []
+    for recipe_id, author_id, name in RecipeModel.objects.filter(
+        author__in={author_id for author_id, _ in new_rows},
+        name__in={name for _, name in new_rows},
+    ).values_list('id', 'author_id', 'name'):
+        row = new_rows.get((author_id, name))
+        if row is None:
+            continue
+        for slug in row.get('tags', ()):
+            tag_lines.append(TagRecipeModel(recipe_id=recipe_id, tag_id=slug))
+        lines = row.get('ingredients', ())
+        for line in lines:
+            ingredient_lines.append(IngredientRecipeModel(
+                recipe_id=recipe_id,
+                ingredient=ingredients[
+                    (line['name'], line['measurement_unit'])],
+                amount=line['amount'],
+            ))
+        documents.append(RecipeSearchModel(
+            recipe_id=recipe_id,
+            document=build_document(
+                name, row['text'], [line['name'] for line in lines]),
+        ))
+    TagRecipeModel.objects.bulk_create(tag_lines)
+    IngredientRecipeModel.objects.bulk_create(ingredient_lines)
+    RecipeSearchModel.objects.bulk_create(documents)
+
+
+def _recipe_ids(rows):
+    """id рецептов по парам (email автора, name) из строк пачки."""
+    return {
+        (email, name): recipe_id
+        for recipe_id, email, name in RecipeModel.objects.filter(
+            author__email__in={row['recipe']['author'] for row in rows},
+            name__in={row['recipe']['name'] for row in rows},
+        ).values_list('id', 'author__email', 'name')
+    }
+
+
+def _import_user_recipes(model, rows):
+    users = User.objects.in_bulk(
+        {row['user'] for row in rows}, field_name='email')
+    recipes = _recipe_ids(rows)
+    objs = []
+    for row in rows:
+        key = (row['recipe']['author'], row['recipe']['name'])
+        if row['user'] not in users or key not in recipes:
+            raise ValueError(f"Не найдены пользователь или рецепт: {row}")
+        objs.append(model(user=users[row['user']], recipe_id=recipes[key]))
+    model.objects.bulk_create(objs, ignore_conflicts=True)
+
+
+def import_favorites(rows):
+    """Избранное: user — email, recipe — {author, name}."""
+    _import_user_recipes(FavoriteModel, rows)
+
+
+def import_shopping_cart(rows):
+    """Корзина: user — email, recipe — {author, name}."""
+    _import_user_recipes(ShoppingCartModel, rows)
+
+
+def import_follows(rows):
+    """Подписки: user — email подписчика, author — email автора."""
+    users = User.objects.in_bulk(
+        {row[field] for row in rows for field in ('user', 'author')},
+        field_name='email')
+    objs = []
+    for row in rows:
+        if row['user'] not in users or row['author'] not in users:
+            raise ValueError(f"Не найден пользователь: {row}")
+        objs.append(FollowModel(
+            user=users[row['user']], follower=users[row['author']]))
+    FollowModel.objects.bulk_create(objs, ignore_conflicts=True)
+
+
+def update_recipe_counters():
+    """Пересчитывает количество рецептов у пользователей."""
+    User.objects.update(
+        recipes_count=count_subquery(RecipeModel, 'author'))
+
+
+def update_relation_counters():
+    """Пересчитывает счетчики избранного, корзин и подписчиков."""
+    RecipeModel.objects.update(
+        favorites_count=count_subquery(FavoriteModel, 'recipe'),
+        shopping_count=count_subquery(ShoppingCartModel, 'recipe'),
+    )
+    User.objects.update(
+        subscribers_count=count_subquery(FollowModel, 'follower'))
+
+
+def export_ingredients(chunk_size):
+    yield from IngredientModel.objects.exclude(id=1).values(
+        'name', 'measurement_unit').iterator(chunk_size=chunk_size)
+
+
+def export_tags(chunk_size):
+    yield from TagModel.objects.values(
+        'name', 'color', 'slug').iterator(chunk_size=chunk_size)
+
+
+def export_users(chunk_size):
+    yield from User.objects.values(
+        'email', 'username', 'first_name', 'last_name', 'password',
+    ).iterator(chunk_size=chunk_size)
+
+
+def export_recipes(chunk_size):
+    """
+    Рецепты с тегами и ингредиентами.
+
+    iterator() не поддерживает prefetch_related, поэтому теги
+    и ингредиенты догружаются отдельными запросами на каждую пачку.
+    """
+    recipes = RecipeModel.objects.order_by('id').values(
+        'id', 'author__email', 'name', 'text', 'cooking_time', 'image',
+    ).iterator(chunk_size=chunk_size)
+    for chunk in batched(recipes, chunk_size):
+        ids = [recipe['id'] for recipe in chunk]
+        tags = {}
+        for recipe_id, slug in TagRecipeModel.objects.filter(
+                recipe_id__in=ids).values_list('recipe_id', 'tag_id'):
+            tags.setdefault(recipe_id, []).append(slug)
+        ingredients = {}
+        for line in IngredientRecipeModel.objects.filter(
+            recipe_id__in=ids
+        ).values('recipe_id', 'ingredient__name',
+                 'ingredient__measurement_unit', 'amount'):
+            ingredients.setdefault(line['recipe_id'], []).append({
+                'name': line['ingredient__name'],
+                'measurement_unit': line['ingredient__measurement_unit'],
+                'amount': line['amount'],
+            })
+        for recipe in chunk:
+            yield {
+                'author': recipe['author__email'],
+                'name': recipe['name'],
+                'text': recipe['text'],
+                'cooking_time': recipe['cooking_time'],
+                'image': recipe['image'],
+                'tags': tags.get(recipe['id'], []),
+                'ingredients': ingredients.get(recipe['id'], []),
+            }
+
+
+def _export_user_recipes(model, chunk_size):
+    for email, author, name in model.objects.values_list(
+        'user__email', 'recipe__author__email', 'recipe__name',
+    ).iterator(chunk_size=chunk_size):
+        yield {'user': email, 'recipe': {'author': author, 'name': name}}
+
+
+def export_favorites(chunk_size):
+    yield from _export_user_recipes(FavoriteModel, chunk_size)
+
+
+def export_shopping_cart(chunk_size):
+    yield from _export_user_recipes(ShoppingCartModel, chunk_size)
+
+
+def export_follows(chunk_size):
+    for email, author in FollowModel.objects.values_list(
+        'user__email', 'follower__email',
+    ).iterator(chunk_size=chunk_size):
+        yield {'user': email, 'author': author}
@@ -0,0 +1,170 @@
+import json
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from core.middleware import percentile
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from profile_user.models import FollowModel
+from recipe.models import RecipeModel
+
+User = get_user_model()
+
+main_dir = Path(__file__).parent.parent.parent.parent.parent
+
+INGREDIENT_PREFIXES = ('аб', 'мол', 'са', 'кар', 'яй', 'сыр', 'му', 'ка')
+SEARCH_QUERIES = ('пирог', 'салат с сыром', 'суп', 'молоко')
+
+
+class Command(BaseCommand):
+    help = 'Benchmarking API endpoints with the Django test client.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-n', '--repeat', type=int, default=50,
+            help='Количество запросов к каждому эндпоинту')
+        parser.add_argument(
+            '--warmup', type=int, default=2,
+            help='Запросы перед замером, в отчет не попадают')
+        parser.add_argument(
+            '--email', type=str,
+            help='Пользователь, от имени которого идут запросы')
+        parser.add_argument(
+            '-o', '--output', type=str, default="data/benchmark.json",
+            help='Report path (via /)')
+        parser.add_argument(
+            '--compare', type=str,
+            help='Прошлый отчет (via /) для сравнения')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['email'])
+        recipe_ids = list(RecipeModel.objects.values_list(
+            'id', flat=True)[:100])
+        if not recipe_ids:
+            raise CommandError(
+                "Нет рецептов, сначала выполните generate_data.")
+        endpoints = {
+            'recipes_list': lambda i: '/api/recipes/?limit=6',
+            'recipes_list_page': lambda i: (
+                f'/api/recipes/?limit=6&offset={6 * (i % 20)}'),
+            'recipes_favorited': lambda i: (
+                '/api/recipes/?limit=6&is_favorited=1'),
+            'recipes_search': lambda i: (
+                f'/api/recipes/?search={SEARCH_QUERIES[i % 4]}'),
+            'recipe_retrieve': lambda i: (
+                f'/api/recipes/{recipe_ids[i % len(recipe_ids)]}/'),
+            'subscriptions': lambda i: (
+                '/api/users/subscriptions/?recipes_limit=3'),
+            'shopping_cart_download': lambda i: (
+                '/api/recipes/download_shopping_cart/'),
+            'ingredients_autocomplete': lambda i: (
+                '/api/ingredients/?name='
+                f'{INGREDIENT_PREFIXES[i % len(INGREDIENT_PREFIXES)]}'),
+        }
+        client = Client()
+        client.force_login(user)
+        results = {}
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for name, make_url in endpoints.items():
+                results[name] = self.measure(
+                    client, make_url, options['repeat'], options['warmup'])
+                self.stdout.write(
+                    f"{name:26} p50 {results[name]['latency_ms']['p50']:8.2f}"
+                    f" мс  p95 {results[name]['latency_ms']['p95']:8.2f} мс"
+                    f"  запросов {results[name]['queries']['max']}")
+
+        report = {
+            'created': datetime.now(timezone.utc).isoformat(),
+            'commit': self.get_commit(),
+            'database': connection.vendor,
+            'user': user.email,
+            'recipes': RecipeModel.objects.count(),
+            'repeat': options['repeat'],
+            'endpoints': results,
+        }
+        output = Path(main_dir, *options['output'].split("/"))
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+        self.stdout.write(f"Отчет записан в {output}")
+        if options['compare']:
+            self.compare(
+                Path(main_dir, *options['compare'].split("/")), report)
+
+    def get_user(self, email):
+        if email:
+            user = User.objects.filter(email=email).first()
+            if user is None:
+                raise CommandError(f"Пользователь {email} не найден.")
+            return user
+        # По умолчанию — пользователь с наибольшим числом подписок.
+        top = FollowModel.objects.values('user').annotate(
+            follows=Count('id')).order_by('-follows').first()
+        user = User.objects.filter(
+            pk=top['user']).first() if top else User.objects.first()
+        if user is None:
+            raise CommandError(
+                "Нет пользователей, сначала выполните generate_data.")
+        return user
+
+    def measure(self, client, make_url, repeat, warmup):
+        latencies, queries, statuses = [], [], set()
+        for index in range(warmup + repeat):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = client.get(make_url(index))
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                elapsed = time.perf_counter() - start
+            if index < warmup:
+                continue
+            latencies.append(elapsed * 1000)
+            queries.append(len(context))
+            statuses.add(response.status_code)
+        return {
+            'statuses': sorted(statuses),
+            'latency_ms': {
+                'p50': percentile(latencies, 50),
+                'p90': percentile(latencies, 90),
+                'p95': percentile(latencies, 95),
+                'p99': percentile(latencies, 99),
+                'mean': statistics.fmean(latencies),
+                'max': max(latencies),
+            },
+            'queries': {
+                'min': min(queries),
+                'max': max(queries),
+                'mean': statistics.fmean(queries),
+            },
+        }
+
+    @staticmethod
+    def get_commit():
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=main_dir,
+                capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def compare(self, path, report):
+        previous = json.loads(path.read_text())
+        self.stdout.write(
+            f"Сравнение с {previous.get('commit')} ({path.name}):")
+        for name, result in report['endpoints'].items():
+            old = previous['endpoints'].get(name)
+            if old is None:
+                continue
+            old_p50 = old['latency_ms']['p50']
+            new_p50 = result['latency_ms']['p50']
+            change = (new_p50 - old_p50) / old_p50 * 100 if old_p50 else 0
+            self.stdout.write(
+                f"{name:26} p50 {old_p50:8.2f} -> {new_p50:8.2f} мс "
+                f"({change:+.0f}%)  запросов {old['queries']['max']} -> "
+                f"{result['queries']['max']}")
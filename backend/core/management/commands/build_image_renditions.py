@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from recipe.images import update_renditions
+from recipe.models import RecipeModel
+
+
+class Command(BaseCommand):
+    help = 'Building reduced copies of recipe images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--missing', action='store_true',
+            help='Only recipes without reduced copies')
+
+    def handle(self, *args, **options):
+        recipes = RecipeModel.objects.exclude(image='')
+        if options['missing']:
+            recipes = recipes.filter(image_renditions={})
+        count = 0
+        for recipe_id, image_name in recipes.values_list(
+                'id', 'image').iterator():
+            update_renditions(recipe_id, image_name)
+            count += 1
+        self.stdout.write(f"Копии фото созданы: рецептов {count}.")
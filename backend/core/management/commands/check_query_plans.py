@@ -0,0 +1,28 @@
+from core.plans import explain, hot_queries
+from django.core.management.base import BaseCommand, CommandError
+from django.db import NotSupportedError
+
+
+class Command(BaseCommand):
+    help = 'Checking that hot queries use indexes (EXPLAIN).'
+
+    def handle(self, *args, **options):
+        failed = []
+        for name, queryset, tables in hot_queries():
+            try:
+                plan, full_scans = explain(queryset)
+            except NotSupportedError as error:
+                raise CommandError(error)
+            scanned = sorted(full_scans & set(tables))
+            if scanned:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(
+                    f"{name:28} полный просмотр: {', '.join(scanned)}"))
+                self.stdout.write(plan)
+            else:
+                self.stdout.write(f"{name:28} OK")
+                if options['verbosity'] > 1:
+                    self.stdout.write(plan)
+        if failed:
+            raise CommandError(
+                f"Запросы без индекса: {', '.join(failed)}.")
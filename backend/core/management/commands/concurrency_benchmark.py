@@ -0,0 +1,147 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.middleware import percentile
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.test import Client, override_settings
+from profile_user.relations import favorites, shopping_cart
+from recipe.models import RecipeModel
+from rest_framework.authtoken.models import Token
+
+User = get_user_model()
+
+# Запросы читателей по кругу.
+READ_URLS = (
+    lambda recipe: f'/api/recipes/{recipe}/',
+    lambda recipe: '/api/recipes/?limit=6&is_favorited=1',
+    lambda recipe: '/api/recipes/?limit=6&is_in_shopping_cart=1',
+    lambda recipe: '/api/recipes/download_shopping_cart/',
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmarking concurrent readers and writers against the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-r', '--readers', type=int, default=8,
+            help='Количество потоков, читающих через API')
+        parser.add_argument(
+            '-w', '--writers', type=int, default=4,
+            help='Количество потоков, переключающих избранное и корзину')
+        parser.add_argument(
+            '-d', '--duration', type=float, default=10,
+            help='Длительность замера, секунд')
+        parser.add_argument(
+            '--users', type=int, default=20,
+            help='Количество пользователей, от имени которых идут запросы')
+
+    def handle(self, *args, **options):
+        users = list(User.objects.order_by('id')[:options['users']])
+        recipe_ids = list(RecipeModel.objects.values_list(
+            'id', flat=True)[:200])
+        if not users or not recipe_ids:
+            raise CommandError(
+                "Нет данных, сначала выполните generate_data.")
+        tokens = [Token.objects.get_or_create(user=user)[0].key
+                  for user in users]
+        self.show_settings()
+
+        deadline = time.monotonic() + options['duration']
+        lock = threading.Lock()
+        stats = {kind: {'latencies': [], 'locked': 0, 'errors': 0}
+                 for kind in ('read', 'write')}
+
+        def record(kind, start, error=None):
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                if error is None:
+                    stats[kind]['latencies'].append(elapsed)
+                elif 'locked' in str(error):
+                    stats[kind]['locked'] += 1
+                else:
+                    stats[kind]['errors'] += 1
+
+        def reader(number):
+            rnd = random.Random(number)
+            client = Client(
+                HTTP_AUTHORIZATION=f'Token {tokens[number % len(tokens)]}')
+            index = number
+            try:
+                while time.monotonic() < deadline:
+                    url = READ_URLS[index % len(READ_URLS)](
+                        rnd.choice(recipe_ids))
+                    index += 1
+                    start = time.perf_counter()
+                    try:
+                        response = client.get(url)
+                        if response.streaming:
+                            b''.join(response.streaming_content)
+                    except OperationalError as error:
+                        record('read', start, error)
+                        continue
+                    record('read', start, None if response.status_code
+                           < 500 else response.status_code)
+            finally:
+                connection.close()
+
+        def writer(number):
+            rnd = random.Random(-number - 1)
+            try:
+                while time.monotonic() < deadline:
+                    relation = rnd.choice((favorites, shopping_cart))
+                    user = rnd.choice(users)
+                    ids = rnd.sample(recipe_ids, min(3, len(recipe_ids)))
+                    start = time.perf_counter()
+                    try:
+                        if not relation.add(user, ids):
+                            relation.remove(user, ids)
+                    except OperationalError as error:
+                        record('write', start, error)
+                        continue
+                    record('write', start)
+            finally:
+                connection.close()
+
+        start = time.monotonic()
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            with ThreadPoolExecutor(
+                    options['readers'] + options['writers']) as executor:
+                futures = [
+                    *(executor.submit(reader, number)
+                      for number in range(options['readers'])),
+                    *(executor.submit(writer, number)
+                      for number in range(options['writers'])),
+                ]
+        elapsed = time.monotonic() - start
+        for future in futures:
+            # Ошибки, кроме блокировок, прерывают замер.
+            future.result()
+
+        for kind, result in stats.items():
+            latencies = result['latencies']
+            line = (f"{kind:5} успешно {len(latencies):6}  "
+                    f"{len(latencies) / elapsed:8.1f} оп/с  "
+                    f"database is locked {result['locked']}  "
+                    f"других ошибок {result['errors']}")
+            if latencies:
+                line += (f"  p50 {percentile(latencies, 50):.1f} мс"
+                         f"  p99 {percentile(latencies, 99):.1f} мс")
+            self.stdout.write(line)
+
+    def show_settings(self):
+        """Выводит базу и действующие PRAGMA SQLite."""
+        self.stdout.write(f"База: {connection.vendor}")
+        if connection.vendor != 'sqlite':
+            return
+        with connection.cursor() as cursor:
+            values = []
+            for name in ('journal_mode', 'synchronous', 'mmap_size',
+                         'cache_size', 'temp_store', 'busy_timeout'):
+                cursor.execute(f'PRAGMA {name}')
+                values.append(f"{name}={cursor.fetchone()[0]}")
+        self.stdout.write(' '.join(values))
@@ -0,0 +1,75 @@
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from ._private import (export_favorites, export_follows, export_ingredients,
+                       export_recipes, export_shopping_cart, export_tags,
+                       export_users, open_file)
+
+main_dir = Path(__file__).parent.parent.parent.parent.parent
+
+# Порядок совпадает с порядком загрузки через import_db.
+dict_model = {
+    "ingredient": export_ingredients,
+    "tag": export_tags,
+    "user": export_users,
+    "recipe": export_recipes,
+    "favorite": export_favorites,
+    "shopping_cart": export_shopping_cart,
+    "follow": export_follows,
+}
+
+
+class Command(BaseCommand):
+    help = 'Exporting data from a database to NDJSON files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-m',
+            '--model',
+            type=str,
+            nargs='*',
+            help='Модели для выгрузки, по умолчанию все',
+            choices=tuple(dict_model),
+            default=list(dict_model),
+        )
+        parser.add_argument(
+            '-o',
+            '--output',
+            type=str,
+            help='Directory path (via /)',
+            default="data/export",
+        )
+        parser.add_argument(
+            '--gzip',
+            action='store_true',
+            help='Сжимать файлы gzip',
+        )
+        parser.add_argument(
+            '-c',
+            '--chunk-size',
+            type=int,
+            help='Количество строк, читаемых из базы за раз',
+            default=2000,
+        )
+
+    def handle(self, *args, **options):
+        output = Path(main_dir, *options['output'].split("/"))
+        output.mkdir(parents=True, exist_ok=True)
+        suffix = '.ndjson.gz' if options['gzip'] else '.ndjson'
+        for name in dict_model:
+            if name not in options['model']:
+                continue
+            path = output / f'{name}{suffix}'
+            count = 0
+            start = time.monotonic()
+            with open_file(path, 'wt') as file:
+                for row in dict_model[name](options['chunk_size']):
+                    file.write(json.dumps(row, ensure_ascii=False))
+                    file.write('\n')
+                    count += 1
+            self.stdout.write(
+                f"{path.name}: строк {count} "
+                f"за {time.monotonic() - start:.1f} с.")
@@ -0,0 +1,174 @@
+import random
+import time
+from array import array
+from itertools import accumulate
+
+from api.v1.cache import RECIPES, bump_version
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipe.models import IngredientModel, TagModel
+
+from ._private import (batched, import_favorites, import_follows,
+                       import_recipes, import_shopping_cart, import_tags,
+                       import_users, update_recipe_counters,
+                       update_relation_counters)
+
+DISHES = ('Салат', 'Суп', 'Пирог', 'Каша', 'Запеканка', 'Омлет', 'Паста',
+          'Рагу', 'Котлеты', 'Блины', 'Соус', 'Десерт')
+AMOUNTS = (1, 2, 3, 5, 10, 50, 100, 150, 200, 250, 500)
+DEFAULT_TAGS = (
+    {'name': 'Завтрак', 'color': '#E26C2D', 'slug': 'breakfast'},
+    {'name': 'Обед', 'color': '#49B64E', 'slug': 'lunch'},
+    {'name': 'Ужин', 'color': '#8775D2', 'slug': 'dinner'},
+)
+
+
+def skewed(rng, size, power=3):
+    """
+    Индекс от 0 до size - 1 со степенным распределением.
+
+    Небольшая часть пользователей и рецептов получает большую
+    часть рецептов, подписок и добавлений в избранное.
+    """
+    return min(int(size * rng.random() ** power), size - 1)
+
+
+class Command(BaseCommand):
+    help = 'Generating synthetic users, recipes and user relations.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--follows', type=int, default=10,
+            help='Среднее число подписок пользователя')
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Среднее число избранных рецептов пользователя')
+        parser.add_argument(
+            '--cart', type=int, default=5,
+            help='Среднее число рецептов в корзине пользователя')
+        parser.add_argument(
+            '--prefix', type=str, default='gen',
+            help='Префикс email и username создаваемых пользователей')
+        parser.add_argument(
+            '--image', type=str, default='',
+            help='Путь к фото в MEDIA_ROOT, общему для всех рецептов')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('-b', '--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError("Нужен хотя бы один пользователь.")
+        self.rng = random.Random(options['seed'])
+        self.options = options
+        self.ingredients = list(IngredientModel.objects.exclude(
+            id=1).values_list('name', 'measurement_unit'))
+        if not self.ingredients:
+            raise CommandError(
+                "Сначала загрузите ингредиенты командой import_db.")
+        # Популярность ингредиентов убывает по закону Ципфа.
+        self.ingredient_weights = list(accumulate(
+            1 / rank for rank in range(1, len(self.ingredients) + 1)))
+        self.rng.shuffle(self.ingredients)
+        if not TagModel.objects.exists():
+            import_tags(list(DEFAULT_TAGS))
+        self.tags = list(TagModel.objects.values_list('slug', flat=True))
+        # Индекс автора для каждого рецепта, 4 байта на рецепт.
+        self.recipe_authors = array('I')
+
+        self.write('user', import_users, self.users())
+        self.write('recipe', import_recipes, self.recipes())
+        self.write('follow', import_follows, self.follows())
+        self.write('favorite', import_favorites,
+                   self.user_recipes(options['favorites']))
+        self.write('shopping_cart', import_shopping_cart,
+                   self.user_recipes(options['cart']))
+        update_recipe_counters()
+        update_relation_counters()
+        bump_version(RECIPES)
+
+    def write(self, name, import_batch, rows):
+        count = 0
+        start = time.monotonic()
+        for batch in batched(rows, self.options['batch_size']):
+            with transaction.atomic():
+                import_batch(batch)
+            count += len(batch)
+        elapsed = time.monotonic() - start
+        self.stdout.write(
+            f"{name}: строк {count} за {elapsed:.1f} с "
+            f"({count / max(elapsed, 1e-6):.0f} строк/с).")
+
+    def email(self, index):
+        return f"{self.options['prefix']}{index}@example.com"
+
+    def users(self):
+        for index in range(self.options['users']):
+            yield {
+                'email': self.email(index),
+                'username': f"{self.options['prefix']}{index}",
+                'first_name': 'Имя',
+                'last_name': 'Фамилия',
+            }
+
+    def recipe_name(self, index):
+        # Имя вычисляется по номеру, чтобы на рецепт можно было
+        # сослаться из избранного и корзины, не храня все рецепты.
+        dish = DISHES[index % len(DISHES)]
+        return f"{dish} {self.options['prefix']}-{index}"
+
+    def recipes(self):
+        rng = self.rng
+        for index in range(self.options['recipes']):
+            author = skewed(rng, self.options['users'])
+            self.recipe_authors.append(author)
+            size = max(1, min(25, round(rng.gauss(8, 3))))
+            chosen = set()
+            while len(chosen) < min(size, len(self.ingredients)):
+                chosen.update(rng.choices(
+                    range(len(self.ingredients)),
+                    cum_weights=self.ingredient_weights,
+                    k=size - len(chosen)))
+            lines = [self.ingredients[i] for i in chosen]
+            yield {
+                'author': self.email(author),
+                'name': self.recipe_name(index),
+                'text': "Понадобится: "
+                        + ", ".join(name for name, _ in lines) + ".",
+                'cooking_time': rng.randint(5, 180),
+                'image': self.options['image'],
+                'tags': rng.sample(self.tags, rng.randint(
+                    1, min(3, len(self.tags)))),
+                'ingredients': [
+                    {'name': name, 'measurement_unit': unit,
+                     'amount': rng.choice(AMOUNTS)}
+                    for name, unit in lines],
+            }
+
+    def follows(self):
+        rng = self.rng
+        users = self.options['users']
+        for user in range(users):
+            authors = {skewed(rng, users) for _ in range(
+                rng.randint(0, 2 * self.options['follows']))}
+            authors.discard(user)
+            for author in sorted(authors):
+                yield {'user': self.email(user), 'author': self.email(author)}
+
+    def user_recipes(self, average):
+        rng = self.rng
+        recipes = len(self.recipe_authors)
+        if not recipes:
+            return
+        for user in range(self.options['users']):
+            chosen = {skewed(rng, recipes, power=2) for _ in range(
+                rng.randint(0, 2 * average))}
+            for recipe in sorted(chosen):
+                yield {
+                    'user': self.email(user),
+                    'recipe': {
+                        'author': self.email(self.recipe_authors[recipe]),
+                        'name': self.recipe_name(recipe),
+                    },
+                }
@@ -1,16 +1,41 @@
-import csv
+import time
 from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from api.v1.cache import INGREDIENTS, RECIPES, TAGS, bump_version
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from recipe.models import IngredientModel
 
+from ._private import (batched, import_favorites, import_follows,
+                       import_ingredients, import_recipes,
+                       import_shopping_cart, import_tags, import_users,
+                       open_file, read_rows, update_recipe_counters,
+                       update_relation_counters)
+
 main_dir = Path(__file__).parent.parent.parent.parent.parent
 
 dict_model = {
-    "ingredient": IngredientModel,
+    "ingredient": import_ingredients,
+    "tag": import_tags,
+    "user": import_users,
+    "recipe": import_recipes,
+    "favorite": import_favorites,
+    "shopping_cart": import_shopping_cart,
+    "follow": import_follows,
+}
+
+dict_format = {
+    ".csv": "csv",
+    ".json": "json",
+    ".ndjson": "ndjson",
+    ".jsonl": "ndjson",
 }
 
 
+relation_models = ("favorite", "shopping_cart", "follow")
+nested_models = ("recipe", "favorite", "shopping_cart")
+
+
 class Command(BaseCommand):
     help = 'Importing data into a database.'
 
@@ -20,35 +45,73 @@ class Command(BaseCommand):
             '--model',
             type=str,
             help='Выберете модель интеграции',
-            choices=("ingredient", ),
+            choices=tuple(dict_model),
             default="ingredient"
         )
         parser.add_argument(
             '-r',
             '--read',
             type=str,
-            help='Database path (via /)',
+            help='Database path (via /): .csv, .json or .ndjson, may be .gz',
             default="data/ingredients.csv",
         )
+        parser.add_argument(
+            '-b',
+            '--batch-size',
+            type=int,
+            help='Количество строк в одной пачке',
+            default=1000,
+        )
 
     def handle(self, *args, **options):
-
-        def _write_bd_model():
-            """Запись экз. моделей в базу данных."""
-            with open(path_db) as file:
-                file = csv.DictReader(file, delimiter=",")
-                for dict_field in file:
-                    inst_model = model(**dict_field)
-                    list_model.append(inst_model)
-            model.objects.bulk_create(list_model)
-
         list_dir = options['read'].split("/")
-        model = dict_model[options['model']]
         path_db = Path(main_dir, *list_dir)
-        list_model = []
-        if not IngredientModel.objects.filter(id=1):
-            inst_model = model(name="Какой-то ингредиент",
-                               measurement_unit="Что-то")
-            list_model.append(inst_model)
-        _write_bd_model()
-        self.stdout.write("Ингредиенты интегрированны!")
+        suffixes = path_db.suffixes
+        if suffixes[-1:] == ['.gz']:
+            suffixes = suffixes[:-1]
+        file_format = dict_format.get(suffixes[-1] if suffixes else None)
+        if file_format is None:
+            raise CommandError(f"Неизвестный формат файла: {path_db.name}")
+        if options['model'] in nested_models and file_format == 'csv':
+            raise CommandError(
+                "Вложенные данные загружаются из JSON или NDJSON.")
+        import_batch = dict_model[options['model']]
+
+        if (options['model'] == 'ingredient'
+                and not IngredientModel.objects.filter(id=1)):
+            # Ингредиент по умолчанию для строк рецептов (SET_DEFAULT).
+            # Ключ тот же, что у остальных ингредиентов, поэтому
+            # повторная загрузка его не дублирует.
+            IngredientModel.objects.get_or_create(
+                name="Какой-то ингредиент", measurement_unit="Что-то")
+
+        count = 0
+        start = time.monotonic()
+        with open_file(path_db) as file:
+            rows = read_rows(file, file_format)
+            for batch in batched(rows, options['batch_size']):
+                try:
+                    with transaction.atomic():
+                        import_batch(batch)
+                except (KeyError, ValueError) as error:
+                    raise CommandError(
+                        f"Ошибка в строках {count + 1}-{count + len(batch)}: "
+                        f"{error!r}")
+                count += len(batch)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f"Обработано строк: {count}")
+
+        if options['model'] == 'ingredient':
+            bump_version(INGREDIENTS)
+        elif options['model'] == 'recipe':
+            update_recipe_counters()
+            bump_version(RECIPES)
+        elif options['model'] == 'tag':
+            bump_version(TAGS)
+            bump_version(RECIPES)
+        elif options['model'] in relation_models:
+            update_relation_counters()
+        elapsed = time.monotonic() - start
+        self.stdout.write(
+            f"Импорт завершен: строк {count} за {elapsed:.1f} с "
+            f"({count / max(elapsed, 1e-6):.0f} строк/с).")
@@ -0,0 +1,105 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from core.middleware import percentile
+from django.core.management.base import BaseCommand, CommandError
+
+
+def process_rss(pid):
+    """Суммарная резидентная память процесса и его потомков, МБ."""
+    total, pids = 0, [pid]
+    while pids:
+        current = pids.pop()
+        try:
+            status = Path(f'/proc/{current}/status').read_text()
+            children = Path(
+                f'/proc/{current}/task/{current}/children').read_text()
+        except OSError:
+            continue
+        for line in status.splitlines():
+            if line.startswith('VmRSS:'):
+                total += int(line.split()[1])
+        pids.extend(int(child) for child in children.split())
+    return total / 1024
+
+
+class Command(BaseCommand):
+    help = 'Load testing a running server over HTTP.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'urls', nargs='+', type=str,
+            help='Адреса, запрашиваемые по кругу')
+        parser.add_argument(
+            '-c', '--concurrency', type=int, default=16,
+            help='Количество одновременных клиентов')
+        parser.add_argument(
+            '-d', '--duration', type=float, default=10,
+            help='Длительность замера, секунд')
+        parser.add_argument(
+            '--token', type=str,
+            help='Токен пользователя для заголовка Authorization')
+        parser.add_argument(
+            '--server-pid', type=int,
+            help='PID мастер-процесса сервера для замера памяти')
+
+    def handle(self, *args, **options):
+        headers = {'Accept': 'application/json'}
+        if options['token']:
+            headers['Authorization'] = f"Token {options['token']}"
+        urls = options['urls']
+        deadline = time.monotonic() + options['duration']
+        lock = threading.Lock()
+        latencies, errors, peak_rss = [], [0], [0.0]
+
+        def client(number):
+            index = number
+            while time.monotonic() < deadline:
+                url = urls[index % len(urls)]
+                index += 1
+                start = time.perf_counter()
+                try:
+                    with urlopen(Request(url, headers=headers),
+                                 timeout=30) as response:
+                        response.read()
+                    failed = False
+                except (HTTPError, URLError, OSError):
+                    failed = True
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    if failed:
+                        errors[0] += 1
+                    else:
+                        latencies.append(elapsed)
+
+        def watch_memory():
+            while time.monotonic() < deadline:
+                peak_rss[0] = max(
+                    peak_rss[0], process_rss(options['server_pid']))
+                time.sleep(0.5)
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(options['concurrency'] + 1) as executor:
+            if options['server_pid']:
+                executor.submit(watch_memory)
+            for number in range(options['concurrency']):
+                executor.submit(client, number)
+        elapsed = time.monotonic() - start
+        if not latencies:
+            raise CommandError(f"Нет успешных ответов, ошибок: {errors[0]}.")
+
+        self.stdout.write(
+            f"запросов {len(latencies)}  ошибок {errors[0]}  "
+            f"{len(latencies) / elapsed:.1f} запр/с")
+        self.stdout.write(
+            f"p50 {percentile(latencies, 50):.1f} мс  "
+            f"p95 {percentile(latencies, 95):.1f} мс  "
+            f"p99 {percentile(latencies, 99):.1f} мс  "
+            f"среднее {statistics.fmean(latencies):.1f} мс")
+        if options['server_pid']:
+            self.stdout.write(f"память сервера (пик) {peak_rss[0]:.0f} МБ")
@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from profile_user.models import FavoriteModel, FollowModel, ShoppingCartModel
+from recipe.models import RecipeModel
+
+from ._private import count_subquery
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuilding denormalized counters of recipes and users.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recipes = RecipeModel.objects.update(
+                favorites_count=count_subquery(FavoriteModel, 'recipe'),
+                shopping_count=count_subquery(ShoppingCartModel, 'recipe'),
+            )
+            users = User.objects.update(
+                recipes_count=count_subquery(RecipeModel, 'author'),
+                subscribers_count=count_subquery(FollowModel, 'follower'),
+            )
+        self.stdout.write(
+            f"Счетчики пересчитаны: рецептов {recipes}, "
+            f"пользователей {users}.")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from recipe.models import RecipeModel
+from recipe.search import index_recipe
+
+
+class Command(BaseCommand):
+    help = 'Rebuilding the full-text search index of recipes.'
+
+    def handle(self, *args, **options):
+        count = 0
+        recipes = RecipeModel.objects.only('id', 'name', 'text')
+        for recipe in recipes.iterator():
+            index_recipe(recipe)
+            count += 1
+        self.stdout.write(f"Поисковый индекс перестроен: рецептов {count}.")
@@ -0,0 +1,257 @@
+"""
+Замер SQL-запросов и времени обработки по эндпоинтам.
+
+QueryStatsMiddleware считает для каждого запроса к API число
+SQL-запросов, их суммарное время, повторяющиеся запросы (признак N+1),
+время сериализации (без запросов к базе), время отрисовки ответа
+и общее время. Сериализацию замеряет timed_serialization, которым
+viewset'ы оборачивают свои сериализаторы. Запросы к базе перехватываются
+через connection.execute_wrapper, который ставится на каждое новое
+соединение, а текущий замер передается через contextvars и потому
+виден и в потоках, где sync_to_async выполняет код асинхронных view.
+Результат отдается в заголовке Server-Timing и копится в query_stats
+по имени view. Статистика
+хранится в памяти процесса, у каждого воркера gunicorn она своя.
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+DUPLICATES_LIMIT = 20
+# Сколько разных повторяющихся запросов хранится на view. При
+# переполнении остаются DUPLICATES_LIMIT самых частых.
+DUPLICATES_KEPT = 10 * DUPLICATES_LIMIT
+
+
+def percentile(values, percent):
+    """Процентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1,
+                       round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class QueryStats:
+    """Скользящее окно замеров по каждому view."""
+
+    metrics = ('total_ms', 'db_ms', 'app_ms', 'serialize_ms', 'render_ms',
+               'queries')
+
+    def __init__(self, window):
+        self.window = window
+        self.lock = threading.Lock()
+        self.samples = {}
+        self.duplicates = {}
+        self.requests = Counter()
+
+    def add(self, view_name, sample, duplicates):
+        with self.lock:
+            samples = self.samples.get(view_name)
+            if samples is None:
+                samples = self.samples[view_name] = deque(maxlen=self.window)
+                self.duplicates[view_name] = Counter()
+            samples.append(sample)
+            self.requests[view_name] += 1
+            counter = self.duplicates[view_name]
+            counter.update(duplicates)
+            if len(counter) > DUPLICATES_KEPT:
+                self.duplicates[view_name] = Counter(
+                    dict(counter.most_common(DUPLICATES_LIMIT)))
+
+    def report(self):
+        with self.lock:
+            samples = {name: list(items)
+                       for name, items in self.samples.items()}
+            duplicates = {name: counter.most_common(DUPLICATES_LIMIT)
+                          for name, counter in self.duplicates.items()}
+            requests = dict(self.requests)
+        views = {}
+        for name, items in samples.items():
+            view = {'requests': requests[name], 'window': len(items)}
+            for index, metric in enumerate(self.metrics):
+                values = [item[index] for item in items]
+                view[metric] = {
+                    'p50': percentile(values, 50),
+                    'p95': percentile(values, 95),
+                    'p99': percentile(values, 99),
+                    'max': max(values),
+                }
+            view['duplicate_queries'] = [
+                {'sql': sql, 'count': count}
+                for sql, count in duplicates[name]]
+            views[name] = view
+        return {'pid': os.getpid(), 'views': views}
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+            self.duplicates.clear()
+            self.requests.clear()
+
+
+query_stats = QueryStats(settings.QUERY_STATS_WINDOW)
+
+
+class _QueryRecorder:
+    """Запросы к базе одного HTTP-запроса."""
+
+    def __init__(self):
+        # Асинхронный view может выполнять запросы из нескольких
+        # потоков одновременно.
+        self.lock = threading.Lock()
+        self.count = 0
+        self.duration = 0.0
+        self.serialization = 0.0
+        self.fingerprints = Counter()
+
+    def add(self, sql, duration):
+        with self.lock:
+            self.duration += duration
+            self.count += 1
+            # Параметры передаются отдельно, поэтому одинаковый текст
+            # запроса означает один и тот же запрос с разными значениями.
+            self.fingerprints[sql] += 1
+
+    def add_serialization(self, duration):
+        with self.lock:
+            self.serialization += duration
+
+    def duplicates(self):
+        return {sql[:300]: count for sql, count in self.fingerprints.items()
+                if count > 1}
+
+
+_recorder = ContextVar('query_stats_recorder', default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    recorder = _recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        recorder.add(sql, time.perf_counter() - start)
+
+
+def timed_serialization(to_representation):
+    """
+    to_representation, время работы которого идет в замер сериализации.
+
+    Время запросов к базе изнутри сериализатора (ленивые связи)
+    вычитается, оно уже учтено в db.
+    """
+    @functools.wraps(to_representation)
+    def wrapper(*args, **kwargs):
+        recorder = _recorder.get()
+        if recorder is None:
+            return to_representation(*args, **kwargs)
+        start, db_before = time.perf_counter(), recorder.duration
+        try:
+            return to_representation(*args, **kwargs)
+        finally:
+            recorder.add_serialization(
+                time.perf_counter() - start
+                - (recorder.duration - db_before))
+    return wrapper
+
+
+def _install_wrapper(sender, connection, **kwargs):
+    # Объект соединения Django живет, пока жив поток, а сигнал
+    # приходит при каждом переподключении.
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(
+    _install_wrapper, dispatch_uid='core.middleware.query_stats')
+
+
+class QueryStatsMiddleware:
+    """Собирает статистику запросов к базе по эндпоинтам."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Так Django понимает, что middleware асинхронный, и не
+            # переключается в основной поток ради его хуков.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+            self.process_template_response = (
+                self.aprocess_template_response)
+        # Соединения, открытые до загрузки middleware.
+        for connection in connections.all():
+            _install_wrapper(None, connection)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not settings.QUERY_STATS_ENABLED:
+            return self.get_response(request)
+        recorder = _QueryRecorder()
+        token = _recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        return self.finish(request, response, recorder, start)
+
+    async def __acall__(self, request):
+        if not settings.QUERY_STATS_ENABLED:
+            return await self.get_response(request)
+        recorder = _QueryRecorder()
+        token = _recorder.set(recorder)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _recorder.reset(token)
+        return self.finish(request, response, recorder, start)
+
+    def finish(self, request, response, recorder, start):
+        total = time.perf_counter() - start
+
+        view_end = getattr(request, '_query_stats_view_end', None)
+        render = time.perf_counter() - view_end if view_end else 0.0
+        render = min(render, total)
+        db_ms = recorder.duration * 1000
+        serialize_ms = max(recorder.serialization * 1000, 0.0)
+        render_ms = render * 1000
+        total_ms = total * 1000
+        app_ms = max(total_ms - db_ms - serialize_ms - render_ms, 0.0)
+
+        match = request.resolver_match
+        view_name = match.view_name if match else 'unresolved'
+        query_stats.add(
+            f'{request.method} {view_name}',
+            (total_ms, db_ms, app_ms, serialize_ms, render_ms,
+             recorder.count),
+            recorder.duplicates(),
+        )
+        if settings.QUERY_STATS_SERVER_TIMING:
+            response['Server-Timing'] = (
+                f'db;dur={db_ms:.1f};desc="{recorder.count} queries", '
+                f'app;dur={app_ms:.1f}, serialize;dur={serialize_ms:.1f}, '
+                f'render;dur={render_ms:.1f}, total;dur={total_ms:.1f}')
+        return response
+
+    def process_template_response(self, request, response):
+        # Вызывается после view и до отрисовки ответа DRF.
+        request._query_stats_view_end = time.perf_counter()
+        return response
+
+    async def aprocess_template_response(self, request, response):
+        request._query_stats_view_end = time.perf_counter()
+        return response
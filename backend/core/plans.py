@@ -0,0 +1,115 @@
+"""
+Проверка планов горячих запросов API.
+
+explain возвращает план запроса и таблицы, которые база читает
+целиком, hot_queries — горячие запросы API вместе с таблицами,
+которые им нельзя просматривать полностью. На них построены тесты
+api.v1.tests.QueryPlanTests и команда check_query_plans, которая
+проверяет те же запросы на рабочих данных.
+"""
+import re
+
+from django.db import NotSupportedError, connection, transaction
+from django.db.models import Exists, OuterRef
+
+from api.v1.views import GetShoppingCartSet, annotate_user_flags
+from profile_user.models import FavoriteModel, FollowModel, ShoppingCartModel
+from recipe.models import IngredientModel, RecipeModel, TagRecipeModel
+
+# Полный просмотр таблицы или индекса в плане SQLite.
+SQLITE_SCAN = re.compile(r'\bSCAN (?:TABLE )?"?([\w-]+)"?')
+# Таблицы и их псевдонимы (U0, T3) в SQL, собранном Django.
+ALIAS = re.compile(r'(?:FROM|JOIN) "([\w-]+)"(?: (?:AS )?(\w+))?')
+# Узлы плана PostgreSQL, читающие таблицу или индекс.
+PG_SCANS = ('Seq Scan', 'Index Scan', 'Index Only Scan')
+
+
+def explain(queryset):
+    """План запроса и таблицы, которые база читает целиком."""
+    if connection.vendor == 'sqlite':
+        return _explain_sqlite(queryset)
+    if connection.vendor == 'postgresql':
+        return _explain_postgresql(queryset)
+    raise NotSupportedError(f"База {connection.vendor} не поддерживается.")
+
+
+def _explain_sqlite(queryset):
+    plan = queryset.explain()
+    aliases = {alias: table for table, alias
+               in ALIAS.findall(str(queryset.query)) if alias}
+    return plan, {aliases.get(table, table)
+                  for table in SQLITE_SCAN.findall(plan)}
+
+
+def _explain_postgresql(queryset):
+    """
+    На маленьких таблицах PostgreSQL выбирает Seq Scan даже при
+    наличии индекса, поэтому он запрещается. Тогда без подходящего
+    индекса в плане остается Seq Scan или Index Scan без Index Cond,
+    то есть чтение всего индекса с фильтром.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            plan = queryset.explain()
+            # psycopg2 сам разбирает JSON-план в список.
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            nodes = [cursor.fetchone()[0][0]['Plan']]
+    full_scans = set()
+    while nodes:
+        node = nodes.pop()
+        nodes.extend(node.get('Plans', ()))
+        if node['Node Type'] in PG_SCANS and 'Index Cond' not in node:
+            full_scans.add(node['Relation Name'])
+    return plan, full_scans
+
+
+def hot_queries():
+    """Горячие запросы API и таблицы, которые нельзя читать целиком."""
+    user = FavoriteModel.objects.values_list(
+        'user', flat=True).first() or 1
+    recipe_ids = list(RecipeModel.objects.values_list(
+        'id', flat=True)[:6]) or [1]
+    author = RecipeModel.objects.values_list(
+        'author', flat=True).first() or 1
+    author_ids = list(FollowModel.objects.filter(
+        user=user).values_list('follower', flat=True)[:10]) or [author]
+    favorite = FavoriteModel.objects.filter(
+        recipe=OuterRef('pk'), user=user)
+    shopping = ShoppingCartModel.objects.filter(
+        recipe=OuterRef('pk'), user=user)
+    return (
+        ('favorite_flags', FavoriteModel.objects.filter(
+            user=user, recipe_id__in=recipe_ids
+        ).values_list('recipe_id'), ('Favorite',)),
+        ('shopping_cart_flags', ShoppingCartModel.objects.filter(
+            user=user, recipe_id__in=recipe_ids
+        ).values_list('recipe_id'), ('ShoppingCart',)),
+        ('follow_flags', FollowModel.objects.filter(
+            user=user, follower_id__in=author_ids
+        ).values_list('follower_id'), ('Follow',)),
+        ('recipe_user_flags', annotate_user_flags(
+            RecipeModel.objects.all(), user)[:6],
+         ('Favorite', 'ShoppingCart', 'Follow')),
+        ('recipes_is_favorited', RecipeModel.objects.filter(
+            Exists(favorite))[:6], ('Favorite',)),
+        ('recipes_is_in_shopping_cart', RecipeModel.objects.filter(
+            Exists(shopping))[:6], ('ShoppingCart',)),
+        ('recipes_by_tags', RecipeModel.objects.filter(
+            Exists(TagRecipeModel.objects.filter(
+                recipe=OuterRef('pk'), tag_id__in=['breakfast'])))[:6],
+         ('Recipe-Tag',)),
+        ('recipes_by_author', RecipeModel.objects.filter(
+            author=author).order_by('-id')[:6], ('Recipe',)),
+        ('subscriptions', FollowModel.objects.filter(
+            user=user).select_related('follower'), ('Follow',)),
+        ('subscriptions_recipes', RecipeModel.objects.filter(
+            author__in=author_ids).latest_per_author(3), ('Recipe',)),
+        ('shopping_cart_download',
+         GetShoppingCartSet().get_ingredient_data(
+             ShoppingCartModel.objects.filter(user=user)),
+         ('ShoppingCart', 'Recipe-Ingredient')),
+        ('ingredient_name_prefix', IngredientModel.objects.filter(
+            name__istartswith='мол'), ('Ingredient',)),
+    )
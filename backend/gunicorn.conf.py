@@ -0,0 +1,35 @@
+"""
+Настройки gunicorn.
+
+GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker запускает проект
+под ASGI и включает асинхронные view для чтения (ASYNC_READ_VIEWS),
+по умолчанию используются синхронные воркеры и backend.wsgi.
+"""
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', 3))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')
+
+if worker_class.startswith('uvicorn'):
+    wsgi_app = 'backend.asgi:application'
+    os.environ.setdefault('ASYNC_READ_VIEWS', 'True')
+else:
+    wsgi_app = 'backend.wsgi:application'
+
+
+def on_starting(server):
+    backend = os.getenv('CACHE_BACKEND', 'LocMemCache')
+    if workers > 1 and backend.endswith('LocMemCache'):
+        server.log.warning(
+            'LocMemCache is per process: with %d workers cached recipe '
+            'lists and catalogs go stale in other workers. Set '
+            'CACHE_BACKEND and CACHE_LOCATION to a shared cache.', workers)
+    sqlite_path = os.getenv('SQLITE_PATH', 'db.sqlite3')
+    if (os.getenv('DB_ENGINE', 'sqlite3') == 'sqlite3'
+            and not os.path.exists(sqlite_path)):
+        server.log.warning(
+            'SQLite database %s does not exist and will be created empty. '
+            'docker-compose mounts backend/sqlite/ since WAL was enabled: '
+            'move an existing backend/db.sqlite3 to '
+            'backend/sqlite/db.sqlite3 before starting.', sqlite_path)
@@ -13,6 +13,8 @@ class FollowModel(models.Model):
         on_delete=models.CASCADE,
         verbose_name="Пользователь",
         related_name='followers',
+        # Покрыт уникальным ограничением (user, follower).
+        db_index=False,
     )
     follower = models.ForeignKey(
         User,
@@ -43,18 +45,27 @@ class FavoriteModel(models.Model):
         on_delete=models.CASCADE,
         verbose_name="Рецепт",
         related_name="favorites",
+        # Покрыт уникальным индексом (recipe, user).
+        db_index=False,
     )
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         verbose_name="Пользователь",
         related_name="favorites",
+        # Покрыт индексом favorite_user_recipe_idx.
+        db_index=False,
     )
 
     class Meta:
         ordering = ("id",)
         db_table = "Favorite"
         unique_together = ('recipe', 'user')
+        indexes = [
+            # Избранное пользователя и флаги is_favorited.
+            models.Index(fields=['user', 'recipe'],
+                         name='favorite_user_recipe_idx'),
+        ]
 
 
 class ShoppingCartModel(models.Model):
@@ -65,15 +76,24 @@ class ShoppingCartModel(models.Model):
         on_delete=models.CASCADE,
         verbose_name="Рецепт",
         related_name="shopping",
+        # Покрыт уникальным индексом (recipe, user).
+        db_index=False,
     )
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         verbose_name="Пользователь",
         related_name="shopping",
+        # Покрыт индексом shopping_cart_user_recipe_idx.
+        db_index=False,
     )
 
     class Meta:
         ordering = ("id",)
         db_table = "ShoppingCart"
         unique_together = ('recipe', 'user')
+        indexes = [
+            # Корзина пользователя и флаги is_in_shopping_cart.
+            models.Index(fields=['user', 'recipe'],
+                         name='shopping_cart_user_recipe_idx'),
+        ]
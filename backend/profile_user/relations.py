@@ -0,0 +1,111 @@
+"""
+Добавление и удаление связей пользователя: избранное, корзина, подписки.
+
+Связи пишутся одним запросом INSERT ... ON CONFLICT DO NOTHING
+или DELETE с RETURNING, поэтому повторный или одновременный запрос
+не падает на уникальном ограничении, а возвращенные id показывают,
+какие связи действительно изменились. По ним же в той же транзакции
+сдвигаются денормализованные счетчики. Нужен PostgreSQL или
+SQLite 3.35+.
+
+Связи, созданные или удаленные через ORM (админка, каскадное
+удаление), учитываются в счетчиках сигналами из signals.py.
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .models import FavoriteModel, FollowModel, ShoppingCartModel
+
+User = get_user_model()
+
+
+def shift_counter(queryset, counter, delta):
+    """
+    Сдвигает счетчик counter на delta у объектов queryset.
+
+    Счетчик не опускается ниже нуля, даже если разошелся с данными.
+    """
+    queryset.update(**{counter: Greatest(F(counter) + delta, 0)})
+
+
+class UserRelation:
+    """Связь пользователя с рецептом или автором и счетчик на цели."""
+
+    def __init__(self, model, target_field, counter):
+        self.model = model
+        self.target = model._meta.get_field(target_field).related_model
+        self.target_column = model._meta.get_field(target_field).column
+        self.target_attname = model._meta.get_field(target_field).attname
+        self.user_column = model._meta.get_field('user').column
+        self.counter = counter
+
+    def _execute(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def update_counter(self, ids, delta):
+        """Сдвигает счетчик у целей с id из ids."""
+        if ids:
+            shift_counter(
+                self.target.objects.filter(pk__in=ids), self.counter, delta)
+
+    def add(self, user, target_ids):
+        """
+        Добавляет связи и возвращает id целей, связь с которыми создана.
+
+        Несуществующие цели и уже существующие связи пропускаются.
+        """
+        target_ids = sorted(set(target_ids))
+        if not target_ids:
+            return []
+        quote = connection.ops.quote_name
+        target_meta = self.target._meta
+        placeholders = ', '.join(['%s'] * len(target_ids))
+        sql = (
+            f'INSERT INTO {quote(self.model._meta.db_table)} '
+            f'({quote(self.user_column)}, {quote(self.target_column)}) '
+            f'SELECT %s, {quote(target_meta.pk.column)} '
+            f'FROM {quote(target_meta.db_table)} '
+            f'WHERE {quote(target_meta.pk.column)} IN ({placeholders}) '
+        )
+        params = [user.pk, *target_ids]
+        if self.target is User:
+            # Подписка на самого себя запрещена ограничением user_neq.
+            sql += f'AND {quote(target_meta.pk.column)} <> %s '
+            params.append(user.pk)
+        sql += f'ON CONFLICT DO NOTHING RETURNING {quote(self.target_column)}'
+        with transaction.atomic():
+            added = self._execute(sql, params)
+            self.update_counter(added, 1)
+        return sorted(added)
+
+    def remove(self, user, target_ids):
+        """Удаляет связи и возвращает id целей, связь с которыми удалена."""
+        target_ids = sorted(set(target_ids))
+        if not target_ids:
+            return []
+        quote = connection.ops.quote_name
+        placeholders = ', '.join(['%s'] * len(target_ids))
+        sql = (
+            f'DELETE FROM {quote(self.model._meta.db_table)} '
+            f'WHERE {quote(self.user_column)} = %s '
+            f'AND {quote(self.target_column)} IN ({placeholders}) '
+            f'RETURNING {quote(self.target_column)}'
+        )
+        with transaction.atomic():
+            removed = self._execute(sql, [user.pk, *target_ids])
+            self.update_counter(removed, -1)
+        return sorted(removed)
+
+
+favorites = UserRelation(FavoriteModel, 'recipe', 'favorites_count')
+shopping_cart = UserRelation(ShoppingCartModel, 'recipe', 'shopping_count')
+follows = UserRelation(FollowModel, 'follower', 'subscribers_count')
+
+relations = {
+    relation.model: relation
+    for relation in (favorites, shopping_cart, follows)
+}
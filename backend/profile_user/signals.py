@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import FavoriteModel, FollowModel, ShoppingCartModel
+from .relations import relations
+
+
+@receiver(post_save, sender=FavoriteModel)
+@receiver(post_save, sender=ShoppingCartModel)
+@receiver(post_save, sender=FollowModel)
+def count_created_relation(sender, instance, created, **kwargs):
+    """Увеличивает счетчик цели при создании связи через ORM."""
+    if created:
+        relation = relations[sender]
+        relation.update_counter(
+            [getattr(instance, relation.target_attname)], 1)
+
+
+@receiver(post_delete, sender=FavoriteModel)
+@receiver(post_delete, sender=ShoppingCartModel)
+@receiver(post_delete, sender=FollowModel)
+def count_deleted_relation(sender, instance, **kwargs):
+    """Уменьшает счетчик цели при удалении связи через ORM."""
+    relation = relations[sender]
+    relation.update_counter([getattr(instance, relation.target_attname)], -1)
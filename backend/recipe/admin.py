@@ -1,7 +1,8 @@
 from django.contrib import admin
-from profile_user.models import FavoriteModel
 from recipe.models import (IngredientModel, IngredientRecipeModel, RecipeModel,
                            TagModel, TagRecipeModel)
+from recipe.images import schedule_renditions
+from recipe.search import index_recipe
 
 
 class IngredientInline(admin.TabularInline):
@@ -18,17 +19,19 @@ class RecipeAdmin(admin.ModelAdmin):
     """Отображение рецептов в панеле администратора."""
     list_display = ("name", "author")
     list_filter = ("author", "name", "tags")
-    readonly_fields = ("favorite_count", )
-
-    def favorite_count(self, obj):
-        return len(FavoriteModel.objects.filter(recipe=obj))
-
-    favorite_count.short_description = "Количество фаворитов"
+    readonly_fields = ("favorites_count", "shopping_count",
+                       "image_renditions")
     inlines = [
         IngredientInline,
         TagInline,
     ]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        index_recipe(form.instance)
+        if 'image' in form.changed_data:
+            schedule_renditions(form.instance)
+
 
 class TagAdmin(admin.ModelAdmin):
     """Отображение тегов в панеле администратора."""
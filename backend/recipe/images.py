@@ -0,0 +1,152 @@
+"""
+Обработка фотографий рецептов.
+
+Оригинал перекодируется без метаданных еще при загрузке
+(strip_metadata). Уменьшенные копии создаются для каждой ширины
+из settings.RECIPE_IMAGE_RENDITIONS и каждого формата
+из settings.RECIPE_IMAGE_FORMATS. Копии создаются в пуле потоков уже
+после фиксации транзакции, поэтому запрос на сохранение рецепта
+их не ждет.
+"""
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from .models import RecipeModel
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS_DIR = 'recipe/renditions'
+
+# Имя формата в Pillow и расширение файла.
+FORMATS = {
+    'webp': ('WEBP', 'webp'),
+    'jpeg': ('JPEG', 'jpg'),
+}
+
+# Форматы, которые Pillow читает, но сохраняет под другим именем.
+SAVE_FORMATS = {'MPO': 'JPEG'}
+# Качество перекодированного оригинала (JPEG, WebP).
+ORIGINAL_QUALITY = 95
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.RECIPE_IMAGE_WORKERS,
+    thread_name_prefix='recipe-image',
+)
+
+
+def _prepare(image):
+    """Поворачивает снимок по EXIF и отбрасывает метаданные."""
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info
+                              else 'RGB')
+    clean = Image.new(image.mode, image.size)
+    clean.paste(image)
+    return clean
+
+
+def strip_metadata(file) -> File:
+    """
+    Копия загруженного фото без EXIF (в том числе GPS) и прочих метаданных.
+
+    Снимок поворачивается по EXIF, формат и имя файла сохраняются.
+    Копия держится в памяти только до FILE_UPLOAD_MAX_MEMORY_SIZE.
+    """
+    with Image.open(file) as original:
+        pil_format = SAVE_FORMATS.get(original.format, original.format)
+        original.load()
+        image = _prepare(original)
+    if pil_format == 'JPEG' and image.mode == 'RGBA':
+        image = image.convert('RGB')
+    output = SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    image.save(output, pil_format, quality=ORIGINAL_QUALITY)
+    output.seek(0)
+    return File(output, name=os.path.basename(file.name))
+
+
+def _encode(image, image_format):
+    pil_format, _ = FORMATS[image_format]
+    if pil_format == 'JPEG' and image.mode == 'RGBA':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, pil_format,
+               quality=settings.RECIPE_IMAGE_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def make_renditions(recipe: RecipeModel) -> dict:
+    """
+    Создает копии фото рецепта и возвращает их пути в хранилище.
+
+    Копии не бывают шире оригинала. Результат имеет вид
+    {'card': {'webp': путь, 'jpeg': путь}, ...}.
+    """
+    storage = recipe.image.storage
+    with recipe.image.open('rb') as file, Image.open(file) as original:
+        original.load()
+        source = _prepare(original)
+    stem = os.path.splitext(os.path.basename(recipe.image.name))[0]
+    renditions = {}
+    for name, width in settings.RECIPE_IMAGE_RENDITIONS.items():
+        image = source
+        if source.width > width:
+            height = round(source.height * width / source.width)
+            image = source.resize((width, height), Image.LANCZOS)
+        renditions[name] = {}
+        for image_format, (_, extension) in FORMATS.items():
+            if image_format not in settings.RECIPE_IMAGE_FORMATS:
+                continue
+            path = (f'{RENDITIONS_DIR}/{recipe.pk}/'
+                    f'{stem}_{name}.{extension}')
+            if storage.exists(path):
+                storage.delete(path)
+            renditions[name][image_format] = storage.save(
+                path, ContentFile(_encode(image, image_format)))
+    return renditions
+
+
+def update_renditions(recipe_id: int, image_name: str) -> None:
+    """Пересоздает копии фото и удаляет устаревшие файлы."""
+    recipe = RecipeModel.objects.filter(pk=recipe_id).only(
+        'id', 'image', 'image_renditions').first()
+    if recipe is None or recipe.image.name != image_name:
+        # Рецепт удален или фото уже заменено новым.
+        return
+    renditions = make_renditions(recipe)
+    new_paths = {path for formats in renditions.values()
+                 for path in formats.values()}
+    for formats in recipe.image_renditions.values():
+        for path in formats.values():
+            if path not in new_paths:
+                recipe.image.storage.delete(path)
+    recipe.image_renditions = renditions
+    recipe.save(update_fields=['image_renditions', 'updated_at'])
+
+
+def _run(recipe_id, image_name):
+    try:
+        update_renditions(recipe_id, image_name)
+    except Exception:
+        logger.exception('Не удалось обработать фото рецепта %s', recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_renditions(recipe: RecipeModel) -> None:
+    """Ставит обработку фото рецепта в очередь после фиксации транзакции."""
+    if not recipe.image:
+        return
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    transaction.on_commit(
+        lambda: _executor.submit(_run, recipe_id, image_name))
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:44
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    RecipeModel = apps.get_model('recipe', 'RecipeModel')
+    FavoriteModel = apps.get_model('profile_user', 'FavoriteModel')
+    ShoppingCartModel = apps.get_model('profile_user', 'ShoppingCartModel')
+
+    def count(model):
+        return Coalesce(Subquery(
+            model.objects.filter(recipe=OuterRef('pk')).order_by()
+            .values('recipe').annotate(count=Count('id')).values('count')
+        ), 0)
+
+    RecipeModel.objects.update(favorites_count=count(FavoriteModel),
+                               shopping_count=count(ShoppingCartModel))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0005_alter_recipemodel_cooking_time'),
+        ('profile_user', '0003_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipemodel',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество фаворитов'),
+        ),
+        migrations.AddField(
+            model_name='recipemodel',
+            name='shopping_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество в корзинах'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
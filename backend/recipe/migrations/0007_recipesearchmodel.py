@@ -0,0 +1,104 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+FTS_SQLITE = (
+    'CREATE VIRTUAL TABLE "RecipeSearchFts" USING fts5('
+    'document, content="RecipeSearch", content_rowid="recipe_id")',
+    'CREATE TRIGGER "RecipeSearch_ai" AFTER INSERT ON "RecipeSearch" BEGIN '
+    'INSERT INTO "RecipeSearchFts"(rowid, document) '
+    'VALUES (new.recipe_id, new.document); END',
+    'CREATE TRIGGER "RecipeSearch_ad" AFTER DELETE ON "RecipeSearch" BEGIN '
+    'INSERT INTO "RecipeSearchFts"("RecipeSearchFts", rowid, document) '
+    'VALUES (\'delete\', old.recipe_id, old.document); END',
+    'CREATE TRIGGER "RecipeSearch_au" AFTER UPDATE ON "RecipeSearch" BEGIN '
+    'INSERT INTO "RecipeSearchFts"("RecipeSearchFts", rowid, document) '
+    'VALUES (\'delete\', old.recipe_id, old.document); '
+    'INSERT INTO "RecipeSearchFts"(rowid, document) '
+    'VALUES (new.recipe_id, new.document); END',
+)
+DROP_FTS_SQLITE = (
+    'DROP TRIGGER IF EXISTS "RecipeSearch_ai"',
+    'DROP TRIGGER IF EXISTS "RecipeSearch_ad"',
+    'DROP TRIGGER IF EXISTS "RecipeSearch_au"',
+    'DROP TABLE IF EXISTS "RecipeSearchFts"',
+)
+GIN_POSTGRESQL = (
+    'CREATE INDEX "RecipeSearch_document_gin" ON "RecipeSearch" '
+    'USING gin (to_tsvector(\'simple\'::regconfig, '
+    'COALESCE("document", \'\')))',
+)
+DROP_GIN_POSTGRESQL = (
+    'DROP INDEX IF EXISTS "RecipeSearch_document_gin"',
+)
+
+
+def _execute(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    """FTS5 в SQLite и GIN-индекс в PostgreSQL, на других СУБД ничего."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _execute(schema_editor, GIN_POSTGRESQL)
+    elif vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute('PRAGMA compile_options')
+            options = {row[0] for row in cursor.fetchall()}
+        if 'ENABLE_FTS5' in options:
+            _execute(schema_editor, FTS_SQLITE)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _execute(schema_editor, DROP_GIN_POSTGRESQL)
+    elif vendor == 'sqlite':
+        _execute(schema_editor, DROP_FTS_SQLITE)
+
+
+def fill_search_documents(apps, schema_editor):
+    from recipe.search import build_document
+
+    RecipeModel = apps.get_model('recipe', 'RecipeModel')
+    RecipeSearchModel = apps.get_model('recipe', 'RecipeSearchModel')
+    IngredientRecipeModel = apps.get_model('recipe', 'IngredientRecipeModel')
+    ingredient_names = {}
+    for recipe_id, name in IngredientRecipeModel.objects.values_list(
+            'recipe_id', 'ingredient__name').iterator():
+        ingredient_names.setdefault(recipe_id, []).append(name)
+    RecipeSearchModel.objects.bulk_create((
+        RecipeSearchModel(
+            recipe_id=recipe_id,
+            document=build_document(
+                name, text, ingredient_names.get(recipe_id, ())),
+        )
+        for recipe_id, name, text in RecipeModel.objects.values_list(
+            'id', 'name', 'text').iterator()
+    ), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0006_recipemodel_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearchModel',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search', serialize=False, to='recipe.recipemodel', verbose_name='Рецепт (id)')),
+                ('document', models.TextField(blank=True, verbose_name='Поисковый документ')),
+            ],
+            options={
+                'db_table': 'RecipeSearch',
+            },
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(fill_search_documents,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0007_recipesearchmodel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipemodel',
+            name='image_renditions',
+            field=models.JSONField(blank=True, default=dict, help_text='Пути к уменьшенным копиям фото по размерам и форматам', verbose_name='Копии фото'),
+        ),
+    ]
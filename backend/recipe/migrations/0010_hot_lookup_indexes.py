@@ -0,0 +1,75 @@
+# Generated by Django 3.2.3 on 2026-10-18 18:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Django ищет по началу и концу названия через UPPER("name"::text) LIKE,
+# триграммный индекс по тому же выражению подходит для обоих случаев.
+TRGM_POSTGRESQL = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS "ingredient_name_trgm_idx" ON "Ingredient" '
+    'USING gin (UPPER("name"::text) gin_trgm_ops)',
+)
+DROP_TRGM_POSTGRESQL = (
+    'DROP INDEX IF EXISTS "ingredient_name_trgm_idx"',
+)
+# LIKE в SQLite не учитывает регистр и использует индекс по началу
+# строки, только если он построен с NOCASE.
+NOCASE_SQLITE = (
+    'CREATE INDEX IF NOT EXISTS "ingredient_name_nocase_idx" '
+    'ON "Ingredient" ("name" COLLATE NOCASE)',
+)
+DROP_NOCASE_SQLITE = (
+    'DROP INDEX IF EXISTS "ingredient_name_nocase_idx"',
+)
+
+
+def _execute(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_name_index(apps, schema_editor):
+    """Индекс поиска ингредиента по названию без учета регистра."""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM pg_available_extensions "
+                           "WHERE name = 'pg_trgm'")
+            available = cursor.fetchone() is not None
+        # Без contrib (pg_trgm) поиск по названию останется без индекса,
+        # это покажет check_query_plans.
+        if available:
+            _execute(schema_editor, TRGM_POSTGRESQL)
+    elif vendor == 'sqlite':
+        _execute(schema_editor, NOCASE_SQLITE)
+
+
+def drop_name_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        _execute(schema_editor, DROP_TRGM_POSTGRESQL)
+    elif vendor == 'sqlite':
+        _execute(schema_editor, DROP_NOCASE_SQLITE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipe', '0009_recipemodel_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipemodel',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recipes', to=settings.AUTH_USER_MODEL, verbose_name='Автор рецепта'),
+        ),
+        migrations.AddIndex(
+            model_name='recipemodel',
+            index=models.Index(fields=['author', '-id'], name='recipe_author_id_idx'),
+        ),
+        migrations.RunPython(create_name_index, drop_name_index),
+    ]
@@ -58,6 +58,28 @@ class IngredientModel(models.Model):
         unique_together = ('name', 'measurement_unit',)
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов рецептов."""
+
+    def with_related(self):
+        """Подгружает автора, теги и ингредиенты для отображения."""
+        return self.select_related('author').prefetch_related(
+            'tags',
+            models.Prefetch(
+                'ingredient_recipe',
+                queryset=IngredientRecipeModel.objects.select_related(
+                    'ingredient'),
+            ),
+        )
+
+    def latest_per_author(self, limit):
+        """Не более limit последних рецептов каждого автора."""
+        latest = self.model.objects.filter(
+            author=models.OuterRef('author')
+        ).order_by('-id').values('id')[:limit]
+        return self.filter(id__in=models.Subquery(latest))
+
+
 class RecipeModel(models.Model):
     """Модель рецептов."""
 
@@ -66,6 +88,8 @@ class RecipeModel(models.Model):
         on_delete=models.CASCADE,
         verbose_name="Автор рецепта",
         related_name='recipes',
+        # Поиск по автору идет по индексу recipe_author_id_idx.
+        db_index=False,
     )
     name = models.CharField(
         verbose_name="Название",
@@ -80,6 +104,12 @@ class RecipeModel(models.Model):
         verbose_name="Фото блюда",
         upload_to="recipe/image/",
     )
+    image_renditions = models.JSONField(
+        verbose_name="Копии фото",
+        help_text="Пути к уменьшенным копиям фото по размерам и форматам",
+        default=dict,
+        blank=True,
+    )
     cooking_time = models.PositiveIntegerField(
         verbose_name="Время (мин.)",
         help_text="Время приготовления в минутах",
@@ -97,6 +127,20 @@ class RecipeModel(models.Model):
         verbose_name="Ингрендиенты",
         through="IngredientRecipeModel"
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name="Количество фаворитов",
+        default=0,
+    )
+    shopping_count = models.PositiveIntegerField(
+        verbose_name="Количество в корзинах",
+        default=0,
+    )
+    updated_at = models.DateTimeField(
+        verbose_name="Дата изменения",
+        auto_now=True,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     def __str__(self) -> str:
         return self.name
@@ -104,6 +148,11 @@ class RecipeModel(models.Model):
     class Meta:
         ordering = ("-id",)
         db_table = "Recipe"
+        indexes = [
+            # Рецепты автора от новых к старым (профиль, подписки).
+            models.Index(fields=['author', '-id'],
+                         name='recipe_author_id_idx'),
+        ]
 
 
 class TagRecipeModel(models.Model):
@@ -161,3 +210,25 @@ class IngredientRecipeModel(models.Model):
         ordering = ("id",)
         db_table = "Recipe-Ingredient"
         unique_together = ["ingredient", "recipe"]
+
+
+class RecipeSearchModel(models.Model):
+    """Поисковый документ рецепта."""
+
+    recipe = models.OneToOneField(
+        RecipeModel,
+        verbose_name="Рецепт (id)",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search',
+    )
+    document = models.TextField(
+        verbose_name="Поисковый документ",
+        blank=True,
+    )
+
+    def __str__(self) -> str:
+        return f'{self.recipe}'
+
+    class Meta:
+        db_table = "RecipeSearch"
@@ -0,0 +1,257 @@
+"""
+Полнотекстовый поиск рецептов.
+
+Название, описание и ингредиенты рецепта разбиваются на слова,
+из которых выбрасываются стоп-слова, а оставшиеся приводятся к основе
+стеммером Портера для русского языка. Полученный документ хранится
+в RecipeSearchModel и индексируется средствами базы данных:
+FTS5 в SQLite и GIN-индексом по to_tsvector в PostgreSQL.
+"""
+import re
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+
+from .models import (IngredientModel, IngredientRecipeModel, RecipeModel,
+                     RecipeSearchModel)
+
+FTS_TABLE = 'RecipeSearchFts'
+
+# Вес поля задается числом повторов его слов в документе.
+NAME_WEIGHT = 3
+INGREDIENTS_WEIGHT = 2
+TEXT_WEIGHT = 1
+
+STOPWORDS = frozenset("""
+и в во не что он на я с со как а то все она так его но да ты к у же вы
+за бы по только ее мне было вот от меня еще нет о из ему теперь когда
+даже ну вдруг ли если уже или ни быть был него до вас нибудь опять уж
+вам ведь там потом себя ничего ей может они тут где есть надо ней для
+мы тебя их чем была сам чтоб без будто чего раз тоже себе под будет ж
+тогда кто этот того потому этого какой совсем ним здесь этом один почти
+мой тем чтобы нее сейчас были куда зачем всех никогда можно при наконец
+два об другой хоть после над больше тот через эти нас про всего них
+какая много разве три эту моя впрочем хорошо свою этой перед иногда
+лучше чуть том нельзя такой им более всегда конечно всю между
+""".split())
+
+_VOWELS = 'аеиоуыэюя'
+_WORD_RE = re.compile(r'\w+')
+
+_PERFECTIVE_GERUND = {
+    'в': True, 'вши': True, 'вшись': True,
+    'ив': False, 'ивши': False, 'ившись': False,
+    'ыв': False, 'ывши': False, 'ывшись': False,
+}
+_REFLEXIVE = {'ся': False, 'сь': False}
+_ADJECTIVE = dict.fromkeys((
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею'), False)
+_PARTICIPLE = {
+    'ем': True, 'нн': True, 'вш': True, 'ющ': True, 'щ': True,
+    'ивш': False, 'ывш': False, 'ующ': False,
+}
+_VERB = {
+    **dict.fromkeys((
+        'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+        'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'), True),
+    **dict.fromkeys((
+        'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+        'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+        'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+        False),
+}
+_NOUN = dict.fromkeys((
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+    'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+    'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я'), False)
+_DERIVATIONAL = ('ость', 'ост')
+_SUPERLATIVE = ('ейше', 'ейш')
+
+
+def _strip(word, endings):
+    """
+    Отрезает самое длинное окончание из endings.
+
+    Окончания со значением True должны следовать за «а» или «я».
+    Возвращает None, если окончание не найдено или условие не выполнено.
+    """
+    for length in range(min(len(word), 6), 0, -1):
+        ending = word[-length:]
+        if ending in endings:
+            stem = word[:-length]
+            if endings[ending] and not stem.endswith(('а', 'я')):
+                return None
+            return stem
+    return None
+
+
+def _regions(word):
+    """Начало областей RV и R2 слова."""
+    rv = next((i + 1 for i, char in enumerate(word) if char in _VOWELS),
+              len(word))
+    r1 = next((i + 1 for i in range(1, len(word))
+               if word[i] not in _VOWELS and word[i - 1] in _VOWELS),
+              len(word))
+    r2 = next((i + 1 for i in range(r1 + 1, len(word))
+               if word[i] not in _VOWELS and word[i - 1] in _VOWELS),
+              len(word))
+    return rv, r2
+
+
+@lru_cache(maxsize=100_000)
+def stem(word: str) -> str:
+    """Основа слова по алгоритму Портера (Snowball) для русского языка."""
+    rv_start, r2_start = _regions(word)
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    stripped = _strip(rv, _PERFECTIVE_GERUND)
+    if stripped is None:
+        reflexive = _strip(rv, _REFLEXIVE)
+        if reflexive is not None:
+            rv = reflexive
+        stripped = _strip(rv, _ADJECTIVE)
+        if stripped is not None:
+            participle = _strip(stripped, _PARTICIPLE)
+            if participle is not None:
+                stripped = participle
+        else:
+            stripped = _strip(rv, _VERB)
+            if stripped is None:
+                stripped = _strip(rv, _NOUN)
+    if stripped is not None:
+        rv = stripped
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    for ending in _DERIVATIONAL:
+        if (rv.endswith(ending)
+                and rv_start + len(rv) - len(ending) >= r2_start):
+            rv = rv[:-len(ending)]
+            break
+
+    if rv.endswith(_SUPERLATIVE):
+        rv = rv[:-4] if rv.endswith('ейше') else rv[:-3]
+        if rv.endswith('нн'):
+            rv = rv[:-1]
+    elif rv.endswith('нн'):
+        rv = rv[:-1]
+    elif rv.endswith('ь'):
+        rv = rv[:-1]
+    return prefix + rv
+
+
+def tokenize(text: str) -> list:
+    """Основы значимых слов текста."""
+    words = _WORD_RE.findall(text.casefold().replace('ё', 'е'))
+    return [stem(word) for word in words
+            if len(word) > 1 and word not in STOPWORDS]
+
+
+def build_document(name: str, text: str, ingredient_names) -> str:
+    """Документ рецепта для полнотекстового индекса."""
+    name_terms = " ".join(tokenize(name))
+    ingredient_terms = " ".join(
+        term for ingredient in ingredient_names
+        for term in tokenize(ingredient))
+    return " ".join(
+        [name_terms] * NAME_WEIGHT
+        + [ingredient_terms] * INGREDIENTS_WEIGHT
+        + [" ".join(tokenize(text))] * TEXT_WEIGHT
+    )
+
+
+def index_recipe(recipe: RecipeModel) -> None:
+    """Обновляет документ рецепта в поисковом индексе."""
+    ingredient_names = IngredientModel.objects.filter(
+        ingredient_recipe__recipe=recipe).values_list('name', flat=True)
+    RecipeSearchModel.objects.update_or_create(
+        recipe=recipe,
+        defaults={'document': build_document(
+            recipe.name, recipe.text, ingredient_names)},
+    )
+
+
+def index_recipes(recipes) -> None:
+    """
+    Обновляет документы рецептов из queryset recipes.
+
+    Нужен при переименовании продукта: названия продуктов всех
+    рецептов читаются одним запросом, документы записываются пачками.
+    """
+    recipes = list(recipes.only('id', 'name', 'text'))
+    ingredient_names = defaultdict(list)
+    for recipe_id, name in IngredientRecipeModel.objects.filter(
+            recipe__in=recipes).values_list('recipe_id', 'ingredient__name'):
+        ingredient_names[recipe_id].append(name)
+    documents = [
+        RecipeSearchModel(recipe_id=recipe.pk, document=build_document(
+            recipe.name, recipe.text, ingredient_names[recipe.pk]))
+        for recipe in recipes
+    ]
+    indexed = set(RecipeSearchModel.objects.filter(
+        recipe__in=recipes).values_list('recipe_id', flat=True))
+    RecipeSearchModel.objects.bulk_update(
+        [doc for doc in documents if doc.recipe_id in indexed],
+        ['document'], batch_size=500)
+    RecipeSearchModel.objects.bulk_create(
+        [doc for doc in documents if doc.recipe_id not in indexed],
+        batch_size=500)
+
+
+def search_recipe_ids(query: str) -> list:
+    """Id рецептов, подходящих под запрос, по убыванию релевантности."""
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+    limit = settings.RECIPE_SEARCH_LIMIT
+    if connection.vendor == 'postgresql':
+        return _search_postgresql(terms, limit)
+    if connection.vendor == 'sqlite' and _has_fts_table():
+        return _search_sqlite(terms, limit)
+    return _search_fallback(terms, limit)
+
+
+def _search_postgresql(terms, limit):
+    from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                                SearchVector)
+
+    vector = SearchVector('document', config='simple')
+    query = SearchQuery(" & ".join(f"{term}:*" for term in terms),
+                        search_type='raw', config='simple')
+    return list(
+        RecipeSearchModel.objects.annotate(search=vector)
+        .filter(search=query)
+        .annotate(rank=SearchRank(vector, query))
+        .order_by('-rank', '-recipe_id')
+        .values_list('recipe_id', flat=True)[:limit]
+    )
+
+
+def _search_sqlite(terms, limit):
+    match = " ".join(f'"{term}"*' for term in terms)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid FROM "{FTS_TABLE}" WHERE "{FTS_TABLE}" MATCH %s '
+            f'ORDER BY rank LIMIT %s',
+            [match, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _search_fallback(terms, limit):
+    queryset = RecipeSearchModel.objects.all()
+    for term in terms:
+        queryset = queryset.filter(document__contains=term)
+    return list(queryset.order_by('-recipe_id')
+                .values_list('recipe_id', flat=True)[:limit])
+
+
+@lru_cache(maxsize=None)
+def _has_fts_table():
+    return FTS_TABLE in connection.introspection.table_names()
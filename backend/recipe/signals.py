@@ -0,0 +1,60 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from profile_user.relations import shift_counter
+from .models import IngredientModel, RecipeModel, TagModel
+from .search import index_recipes
+
+User = get_user_model()
+
+# Поля автора, которые входят в ответ с рецептом.
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+def is_author_change(created, update_fields):
+    """Сохранение пользователя меняет данные автора в его рецептах."""
+    return not created and (
+        update_fields is None or bool(AUTHOR_FIELDS & set(update_fields)))
+
+
+@receiver(post_save, sender=RecipeModel)
+def count_created_recipe(instance, created, **kwargs):
+    """Увеличивает счетчик рецептов автора."""
+    if created:
+        shift_counter(User.objects.filter(pk=instance.author_id),
+                      'recipes_count', 1)
+
+
+@receiver(post_delete, sender=RecipeModel)
+def count_deleted_recipe(instance, **kwargs):
+    """Уменьшает счетчик рецептов автора."""
+    shift_counter(User.objects.filter(pk=instance.author_id),
+                  'recipes_count', -1)
+
+
+@receiver([post_save, pre_delete], sender=TagModel)
+@receiver([post_save, pre_delete], sender=IngredientModel)
+def touch_catalog_recipes(sender, instance, created=False, **kwargs):
+    """Обновляет дату изменения рецептов с измененным тегом или продуктом."""
+    if created:
+        return
+    field = 'tags' if sender is TagModel else 'ingredients'
+    RecipeModel.objects.filter(**{field: instance}).update(
+        updated_at=timezone.now())
+
+
+@receiver(post_save, sender=User)
+def touch_author_recipes(instance, created, update_fields, **kwargs):
+    """Обновляет дату изменения рецептов при изменении их автора."""
+    if is_author_change(created, update_fields):
+        RecipeModel.objects.filter(author=instance).update(
+            updated_at=timezone.now())
+
+
+@receiver(post_save, sender=IngredientModel)
+def reindex_ingredient_recipes(instance, created, **kwargs):
+    """Обновляет поисковые документы рецептов с измененным продуктом."""
+    if not created:
+        index_recipes(RecipeModel.objects.filter(ingredients=instance))
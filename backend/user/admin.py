@@ -11,6 +11,7 @@ class UserAdmin(admin.ModelAdmin):
     """Отображение пользователей в панеле администратора."""
 
     list_filter = ('email', 'username')
+    readonly_fields = ('recipes_count', 'subscribers_count')
     inlines = [
         FavoriteInline,
         ShoppingCartInline,
@@ -0,0 +1,45 @@
+# Generated by Django 3.2.3 on 2026-10-18 17:44
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_counters(apps, schema_editor):
+    UserModel = apps.get_model('user', 'UserModel')
+    RecipeModel = apps.get_model('recipe', 'RecipeModel')
+    FollowModel = apps.get_model('profile_user', 'FollowModel')
+
+    def count(model, field):
+        return Coalesce(Subquery(
+            model.objects.filter(**{field: OuterRef('pk')}).order_by()
+            .values(field).annotate(count=Count('id')).values('count')
+        ), 0)
+
+    UserModel.objects.update(
+        recipes_count=count(RecipeModel, 'author'),
+        subscribers_count=count(FollowModel, 'follower'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0001_initial'),
+        ('recipe', '0002_initial'),
+        ('profile_user', '0003_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usermodel',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество рецептов'),
+        ),
+        migrations.AddField(
+            model_name='usermodel',
+            name='subscribers_count',
+            field=models.PositiveIntegerField(default=0, verbose_name='Количество подписчиков'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -25,6 +25,14 @@ class UserModel(AbstractUser):
         max_length=254,
         unique=True,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name="Количество рецептов",
+        default=0,
+    )
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name="Количество подписчиков",
+        default=0,
+    )
     groups = None
     # костыль
     USERNAME_FIELD = 'email'